@@ -0,0 +1,68 @@
+import numpy as np
+
+
+def split(amount, weights, rng=None):
+    """
+    Splits amount units in proportion to integer weights.
+
+    Every part gets the integer part of its share and the units left go to the
+    parts with the largest remainders. Integer arithmetic is used throughout so
+    the parts always add up to amount exactly.
+
+    Args:
+        amount: A non-negative number of units to split.
+        weights: An array of non-negative integer weights with a positive sum.
+        rng: A numpy random Generator used to break ties between parts with the
+             same remainder. If None, ties go to the parts that come first.
+    Returns:
+        An integer array with the number of units of each part.
+    """
+    weights = np.asarray(weights, dtype=np.int64)
+    total = int(weights.sum())
+    scaled = amount * weights
+    parts, remainders = scaled // total, scaled % total
+    left = amount - int(parts.sum())
+    if left > 0:
+        n = len(weights)
+        ties = rng.permutation(n) if rng is not None else np.arange(n)
+        order = np.lexsort((ties, -remainders))
+        parts[order[:left]] += 1
+    return parts
+
+
+def redistribute(targets, amount, rng=None):
+    """
+    Moves quantity to (or from) the given targets in one pass.
+
+    Added units are spread equally. Removed units are taken in proportion to
+    the current targets so that no target goes below zero.
+
+    Args:
+        targets: A dict mapping partners to target quantities. It is updated
+                 in place.
+        amount: Units to add (if positive) or remove (if negative). Whole
+                numbers stored as floats are accepted.
+        rng: A numpy random Generator to break ties (see `split`).
+    Returns:
+        The units that could not be moved: amount itself if there are no
+        targets, or the (negative) units left when removing more than the
+        targets hold.
+    """
+    keys = list(targets)
+    amount = int(amount)
+    if amount == 0 or not keys:
+        return amount
+    quantities = np.array([targets[k] for k in keys], dtype=np.int64)
+    left = 0
+    if amount > 0:
+        quantities += split(amount, np.ones(len(keys), dtype=np.int64), rng)
+    else:
+        available = np.maximum(quantities, 0)
+        if available.sum() <= -amount:
+            left = amount + int(available.sum())
+            quantities -= available
+        else:
+            quantities -= split(-amount, available, rng)
+    for k, q in zip(keys, quantities.tolist()):
+        targets[k] = q
+    return left
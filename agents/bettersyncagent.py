@@ -1,11 +1,24 @@
 from scml.oneshot import *
-from negmas import ResponseType
+from negmas import ResponseType, SAOResponse
 from scml.scml2020.common import QUANTITY, TIME, UNIT_PRICE
 import numpy as np
 import random
 from math import floor
+from agents.ufuncalc import UFunCalc
+from agents.profiling import CallbackProfiler
+from agents.reports import PartnerBalances
+from agents.pricing import PriceSolver
+from agents.allocation import redistribute
+from agents.negotiation import FIRST, NegotiationTable
+from agents.selection import SubsetSelector
 
 class BetterSyncAgent(OneShotAgent):
+    # Set profile to True (on the class, before running a world) to time the
+    # callbacks of every instance. The report is kept in `profile_report` at
+    # the end of the world and also saved to profile_path if it is given.
+    profile = False
+    profile_path = None
+
     def init(self):
         # Initializes the agent.
         # Gets the probability of different exogenous contracts quantities given the world size
@@ -22,30 +35,47 @@ class BetterSyncAgent(OneShotAgent):
             self.output = [False]
             self.partner = 'seller'
 
-        self.balances = {c: [] for c in self.partners}
+        self.balances = PartnerBalances(self.awi, self.partners)
+        self.negotiations = NegotiationTable(self.partners)
+        self.accepted_offers = {}
+        self.ufc = UFunCalc(self.ufun)
+        self.price_solver = PriceSolver(self.ufc, self.output[0])
         self.n_negotiation_rounds = self.awi.settings["neg_n_steps"]
         self.debug = False
+        self.setup_profiler()
+
+    def setup_profiler(self):
+        self.profiler = None
+        self.profile_report = None
+        if self.profile:
+            self.profiler = CallbackProfiler(self)
+            self.profiler.instrument()
+
+    def step(self):
+        # Called at the end of every simulation step
+        super().step()
+        if self.profiler is not None and self.awi.current_step == self.awi.n_steps - 1:
+            self.profile_report = self.profiler.report()
+            if self.profile_path is not None:
+                self.profiler.save(self.profile_path)
 
     def before_step(self):
         # Sets the agent up for the round.
         # Resets the number of proposals/offers/waits to 0
         # Finds information about the exogenous contracts for the round
         if (self.awi.current_step - 1) % 5 == 0:
-            for c in self.partners:
-                self.balances[c].append(self.awi.reports_at_step(self.awi.current_step - 1)[c].cash)
-
-        self.accepted_offers = {}
-        self.received_offers = {}
-        self.sent_offers = {c: 'First' for c in self.partners}
+            self.balances.update(self.awi.current_step - 1)
 
-        self.proposal_count = {c: 0 for c in self.partners}
-        self.response_count = {c: 0 for c in self.partners}
-        self.wait_count = {c: 0 for c in self.partners}
+        self.accepted_offers.clear()
+        self.negotiations.reset()
 
         self.num_in = self.awi.exogenous_contract_summary[0][0]
         self.num_out = self.awi.exogenous_contract_summary[-1][0]
         self.ufun.find_limit(True)
         self.ufun.find_limit(False)
+        # the ufun is replaced every step
+        self.ufc.refresh(self.ufun)
+        self.update_baseline()
 
         if self.awi.level == 0:
             self.q = self.awi.state().exogenous_input_quantity
@@ -58,31 +88,34 @@ class BetterSyncAgent(OneShotAgent):
             self.max_price = self.awi.current_input_issues[UNIT_PRICE].max_value
 
     def propose(self, negotiator_id: str, state) -> "Outcome":
-        self.wait_count[negotiator_id] = 0
-        if self.sent_offers[negotiator_id] == 'First':
+        record = self.negotiations[negotiator_id]
+        record.waits = 0
+        if record.sent == FIRST:
             offer = self.get_first_offer(negotiator_id, state)
-            self.sent_offers[negotiator_id] = offer
+            record.sent = offer
         else:
-            offer = self.sent_offers[negotiator_id]
+            offer = record.sent
         if self.debug:
             print(f'I am proposing {offer} to {negotiator_id}')
         return offer
 
     def respond(self, negotiator_id, state, offer):
         self.cleanup(negotiator_id, offer)
-        if self.wait_count[negotiator_id] < (self.max_wait - 1) and len(self.received_offers) < len(self.partners):
-            self.wait_count[negotiator_id] += 1
+        record = self.negotiations[negotiator_id]
+        if record.waits < (self.max_wait - 1) and self.negotiations.n_received < len(self.partners):
+            record.waits += 1
             response = ResponseType.WAIT
         else:
-            response = self.get_response(negotiator_id, state, offer)
+            response = self.decide(negotiator_id, state, offer)
         if response == ResponseType.REJECT_OFFER:
-            self.sent_offers[negotiator_id] = self.get_offer(negotiator_id, state, offer)
+            record.sent = self.get_offer(negotiator_id, state, offer)
         else:
-            self.sent_offers[negotiator_id] = [0, self.awi.current_step, 0]
+            record.sent = [0, self.awi.current_step, 0]
         if self.debug:
             if response != ResponseType.WAIT:
-                print(f'I have {len(self.received_offers)} offers waiting for me: {self.received_offers}')
-                print(f'I am responding to {negotiator_id}\'s offer of {offer} with {response} after waiting {self.wait_count[negotiator_id]} times')
+                received = self.negotiations.received_offers()
+                print(f'I have {len(received)} offers waiting for me: {received}')
+                print(f'I am responding to {negotiator_id}\'s offer of {offer} with {response} after waiting {record.waits} times')
                 print(f'The time step is {state.step}')
         return response
 
@@ -95,141 +128,131 @@ class BetterSyncAgent(OneShotAgent):
         offer[QUANTITY] = q
         offer[UNIT_PRICE] = p
         self.q -= q
+        self.set_accepted(negotiator_id, offer)
+
+    def set_accepted(self, negotiator_id, offer):
+        # Records an accepted offer. Always go through here (not through
+        # accepted_offers) so that the baseline used by get_diff stays current
         self.accepted_offers[negotiator_id] = tuple(offer)
-        
+        self.update_baseline()
+
+    def update_baseline(self):
+        # The accepted offers only change when an offer is accepted so their
+        # execution is worked out here once. get_diff then only prices the
+        # change an offer makes to it (see OfferBaseline). Accepted offers are
+        # also kept in execution order (a stable sort by price like in
+        # from_offers) for the evaluations that add several offers.
+        key = (lambda o: -o[UNIT_PRICE]) if self.output[0] else (lambda o: o[UNIT_PRICE])
+        self.accepted = tuple(sorted(self.accepted_offers.values(), key=key))
+        self.accepted_outputs = tuple(self.output * len(self.accepted))
+        self.baseline = self.ufc.baseline(self.accepted, self.accepted_outputs)
+        self.base_util = self.baseline.utility
+
     def get_diff(self, offers):
-        accepted = []
-        for nid in self.accepted_offers:
-            accepted.append(self.accepted_offers[nid])
-        dis_util = self.ufun.from_offers(tuple(accepted), tuple(self.output*len(accepted)))
-        accepted.extend(offers)
-        new_util = self.ufun.from_offers(tuple(accepted), tuple(self.output*len(accepted)))
-        return new_util - dis_util
+        # Utility gained by adding offers to the accepted offers
+        if len(offers) == 1:
+            return self.baseline.with_offer(offers[0], self.output[0]) - self.base_util
+        offers = tuple(tuple(o) for o in offers)
+        new_util = self.ufc.from_offers(
+            self.accepted + offers, self.accepted_outputs + tuple(self.output * len(offers))
+        )
+        return new_util - self.base_util
 
     def on_negotiation_failure(self, partners, annotation, mechanism, state):
         pass
     
     def get_first_offer(self, negotiator_id, state):
-        self.proposal_count[negotiator_id] += 1
+        self.negotiations[negotiator_id].proposals += 1
 
     def cleanup(self, negotiator_id, offer):
-        try:
-            del self.sent_offers[negotiator_id]
-        except:
-            pass
-        self.received_offers[negotiator_id] = offer
+        self.negotiations.receive(negotiator_id, offer)
+
+    def decide(self, negotiator_id, state, offer):
+        # The response to an offer once we stop waiting for the other partners
+        return self.get_response(negotiator_id, state, offer)
 
     def get_response(self, negotiator_id, state, offer):
-        self.response_count[negotiator_id] += 1
+        self.negotiations[negotiator_id].responses += 1
 
     def get_offer(self, negotiator_id, state, offer):
-        self.proposal_count[negotiator_id] += 1
+        self.negotiations[negotiator_id].proposals += 1
 
 
 class TestAgent(BetterSyncAgent):
-    def init(self):
-        # Initializes the agent.
-        # Gets the probability of different exogenous contracts quantities given the world size
-        # Does some administrative stuff based on the level of the agent
-        self.world_size = f'{len(self.awi.all_consumers[0])} {len(self.awi.all_consumers[1])}'
-        self.max_wait = len(self.awi.all_consumers[0]) + len(self.awi.all_consumers[1]) + 1
-        if self.awi.level == 0:
-            self.partners = self.awi.my_consumers
-            self.output = [True]
-            self.partner = 'buyer'
+    # seed of the random tie-breaks when redistributing quantities. If None,
+    # one is drawn from `random` so seeding `random` makes runs repeatable.
+    seed = None
 
-        elif self.awi.level == 1:
-            self.partners = self.awi.my_suppliers
-            self.output = [False]
-            self.partner = 'seller'
-
-        self.balances = {c: [] for c in self.partners}
+    def init(self):
+        super().init()
+        self.rng = np.random.default_rng(self.seed if self.seed is not None else random.randrange(2**32))
 
     def before_step(self):
-        # Sets the agent up for the round.
-        # Resets the number of proposals/offers/waits to 0
-        # Finds information about the exogenous contracts for the round
+        # Sets the agent up for the round like BetterSyncAgent.
         # Finds a target quantity and price for each negotiation based on the exog summary and balances of the agents
-        if (self.awi.current_step - 1) % 5 == 0:
-            for c in self.partners:
-                self.balances[c].append(self.awi.reports_at_step(self.awi.current_step - 1)[c].cash)
-
-        self.accepted_offers = {}
-        self.received_offers = {}
-        self.sent_offers = {c: 'First' for c in self.partners}
-
-        self.proposal_count = {c: 0 for c in self.partners}
-        self.response_count = {c: 0 for c in self.partners}
-        self.wait_count = {c: 0 for c in self.partners}
-
-        self.num_in = self.awi.exogenous_contract_summary[0][0]
-        self.num_out = self.awi.exogenous_contract_summary[-1][0]
-        self.ufun.find_limit(True)
-        self.ufun.find_limit(False)
+        super().before_step()
 
+        # the target price is the worst price at which getting all the needed
+        # quantity from one partner still beats a fraction of the utility range
+        utility_range = self.ufun.max_utility - self.ufun([0, 0, 0])
         if self.awi.level == 0:
-            self.q = self.awi.state().exogenous_input_quantity
             self.desperation = self.num_in/self.num_out
-            self.min_price = self.awi.current_output_issues[UNIT_PRICE].min_value
-            self.max_price = self.awi.current_output_issues[UNIT_PRICE].max_value
             if self.desperation < 1:
                 target_price = self.max_price
             else:
-                for price in range(self.min_price, self.max_price+1):
+                frac = 1.3/self.desperation
+                target_price = self.price_solver.worst_price_above(
+                    self.q, frac*utility_range, self.min_price, self.max_price)
+                if target_price is None:
                     target_price = self.min_price
-                    frac = 1.3/self.desperation
-                    if self.ufun([self.q, 0, price]) > frac*(self.ufun.max_utility - self.ufun([0, 0, 0])):
-                        target_price = price
-                        break
 
         elif self.awi.level == 1:
-            self.q = self.awi.state().exogenous_output_quantity
             self.desperation = self.num_out/self.num_in
-            self.min_price = self.awi.current_input_issues[UNIT_PRICE].min_value
-            self.max_price = self.awi.current_input_issues[UNIT_PRICE].max_value
             if self.desperation < 1:
                 target_price = self.min_price
             else:
-                for price in range(self.max_price, self.min_price - 1, -1):
+                target_price = self.price_solver.worst_price_above(
+                    self.q, 1/self.desperation*utility_range, self.min_price, self.max_price)
+                if target_price is None:
                     target_price = self.max_price
-                    if self.ufun([self.q, 0, price]) > 1/self.desperation*(self.ufun.max_utility - self.ufun([0, 0, 0])):
-                        target_price = price
-                        break
         if self.awi.current_step == 0:
             dist = {p: np.round(self.q/len(self.partners)) for p in self.partners}
         else:
-            ratios = {c: 1/self.balances[c][-1] for c in self.balances}
+            latest = self.balances.latest().tolist()
+            ratios = {c: 1/latest[i] for i, c in enumerate(self.partners)}
             const = self.q/(sum(ratios.values()))
             dist = {c: floor(ratios[c]*const) for c in self.partners}
-        while sum(dist.values()) < self.q:
-            dist[random.choice(list(dist.keys()))] += 1
+        if sum(dist.values()) < self.q:
+            redistribute(dist, int(self.q - sum(dist.values())), self.rng)
         self.target_q = dist
         self.target_price = {c: target_price for c in self.partners}
 
 
     def propose(self, negotiator_id: str, state) -> "Outcome":
-        self.wait_count[negotiator_id] = 0
-        if self.sent_offers[negotiator_id] == 'First':
+        record = self.negotiations[negotiator_id]
+        record.waits = 0
+        if record.sent == FIRST:
             offer = self.get_first_offer(negotiator_id, state)
-            self.sent_offers[negotiator_id] = offer
+            record.sent = offer
         else:
-            offer = self.sent_offers[negotiator_id]
+            offer = record.sent
         return offer
 
 
     def respond(self, negotiator_id, state, offer):
         self.cleanup(negotiator_id, offer)
+        record = self.negotiations[negotiator_id]
         if sum(self.target_q.values()) <= 0:
             response = ResponseType.END_NEGOTIATION
-        elif self.wait_count[negotiator_id] < (self.max_wait - 1) and len(self.received_offers) != len(self.target_q):
-            self.wait_count[negotiator_id] += 1
+        elif record.waits < (self.max_wait - 1) and self.negotiations.n_received != len(self.target_q):
+            record.waits += 1
             response = ResponseType.WAIT
         else:
             response = self.get_response(negotiator_id, state, offer)
         if response == ResponseType.REJECT_OFFER:
-            self.sent_offers[negotiator_id] = self.get_offer(negotiator_id, state, offer)
+            record.sent = self.get_offer(negotiator_id, state, offer)
         else:
-            self.sent_offers[negotiator_id] = [0, 0, 0]
+            record.sent = [0, 0, 0]
         return response
 
 
@@ -246,26 +269,11 @@ class TestAgent(BetterSyncAgent):
         del self.target_price[negotiator_id]
         del self.target_q[negotiator_id]
 
-        if target > q:
-            diff = target - offer[QUANTITY]
-            overage = False
-        elif target < q:
-            diff = -(target - offer[QUANTITY])
-            overage = True
-        elif target == q:
-            diff = 0
-
-        while diff > 0 and sum(self.target_q.values()) > 0:
-            ind = random.choice(list(self.target_q.keys()))
-            if overage:
-                if self.target_q[ind] > 0:
-                    self.target_q[ind] -= 1
-                    diff -= 1
-            else:
-                self.target_q[ind] += 1
-                diff -= 1
+        # get what is missing from the other partners or, if we got more than
+        # the target, ask them for less
+        redistribute(self.target_q, target - q, self.rng)
 
-        self.accepted_offers[negotiator_id] = offer
+        self.set_accepted(negotiator_id, offer)
 
 
     def on_negotiation_failure(self, partners, annotation, mechanism, state):
@@ -277,29 +285,27 @@ class TestAgent(BetterSyncAgent):
         del self.target_price[negotiator_id]
         del self.target_q[negotiator_id]
 
-        diff = target
-        while diff > 0 and len(self.target_q) > 0:
-            ind = random.choice(list(self.target_q.keys()))
-            self.target_q[ind] -= 1
-            diff -= 1
+        if target > 0:
+            redistribute(self.target_q, -target, self.rng)
+
 
+    def decide(self, negotiator_id, state, offer):
+        if sum(self.target_q.values()) <= 0:
+            return ResponseType.END_NEGOTIATION
+        return self.get_response(negotiator_id, state, offer)
 
     def get_first_offer(self, negotiator_id, state):
         offer = [-1]*3
         offer[UNIT_PRICE] = self.target_price[negotiator_id]
         offer[QUANTITY] = self.target_q[negotiator_id]
         offer[TIME] = self.awi.current_step
-        self.proposal_count[negotiator_id] += 1
+        self.negotiations[negotiator_id].proposals += 1
         toffer = tuple(offer)
         print(toffer)
         return toffer
 
     def cleanup(self, negotiator_id, offer):
-        try:
-            del self.sent_offers[negotiator_id]
-        except:
-            pass
-        self.received_offers[negotiator_id] = offer
+        self.negotiations.receive(negotiator_id, offer)
 
     def get_response(self, negotiator_id, state, offer):
         if self.awi.level == 0:
@@ -312,9 +318,9 @@ class TestAgent(BetterSyncAgent):
                 response = ResponseType.ACCEPT_OFFER
             else:
                 response = ResponseType.REJECT_OFFER
-        self.response_count[negotiator_id] += 1
+        self.negotiations[negotiator_id].responses += 1
         if response != ResponseType.WAIT:
-            del self.received_offers[negotiator_id]
+            self.negotiations.answered(negotiator_id)
         return response
 
     def get_offer(self, negotiator_id, state, offer):
@@ -326,5 +332,74 @@ class TestAgent(BetterSyncAgent):
         self.target_price[negotiator_id] = offer[UNIT_PRICE]
         offer[QUANTITY] = self.target_q[negotiator_id]
         offer[TIME] = self.awi.current_step
-        self.proposal_count[negotiator_id] += 1
+        self.negotiations[negotiator_id].proposals += 1
         return tuple(offer)
+
+
+class SyncMode(OneShotSyncAgent):
+    """
+    Makes a BetterSyncAgent (or subclass) decide on all offers together.
+
+    Instead of answering WAIT to every partner until all offers are in,
+    offers are collected by the scml/negmas sync controller and answered in
+    one `counter_all` call as soon as the last one arrives. The controller
+    only waits for negotiations that are still running so the number of
+    round trips does not grow with the size of the world.
+
+    Put it first in the bases of an agent:
+
+        class SyncNewAgent(SyncMode, NewAgent):
+            pass
+
+    Remarks:
+        - The agent's own logic is used unchanged: `get_first_offer` for the
+          first proposals and `decide` and `get_offer` for every offer.
+        - With joint_acceptance set, `decide` is replaced by accepting the
+          set of offers that is best together (see `SubsetSelector`) and
+          rejecting the rest.
+    """
+    joint_acceptance = False
+    # seconds a joint selection may take
+    selection_time_budget = 0.05
+    def first_proposals(self):
+        # called again during the step when a proposal is needed so only
+        # running negotiations are included
+        proposals = dict()
+        for negotiator_id in self.active_negotiators.keys():
+            record = self.negotiations[negotiator_id]
+            record.waits = 0
+            if record.sent == FIRST:
+                record.sent = self.get_first_offer(negotiator_id, self.get_nmi(negotiator_id).state)
+            proposals[negotiator_id] = record.sent
+        return proposals
+
+    def select_offers(self, offers):
+        # The partners whose offers are best accepted together
+        selector = SubsetSelector(self.ufc, self.output[0], time_budget=self.selection_time_budget)
+        chosen, _ = selector.select(offers, self.accepted)
+        return set(chosen)
+
+    def counter_all(self, offers, states):
+        for negotiator_id, offer in offers.items():
+            self.cleanup(negotiator_id, offer)
+        chosen = self.select_offers(offers) if self.joint_acceptance else None
+        responses = dict()
+        for negotiator_id, offer in offers.items():
+            state, record = states[negotiator_id], self.negotiations[negotiator_id]
+            if chosen is None:
+                response = self.decide(negotiator_id, state, offer)
+            elif negotiator_id in chosen:
+                response = ResponseType.ACCEPT_OFFER
+            else:
+                response = ResponseType.REJECT_OFFER
+            if response == ResponseType.REJECT_OFFER:
+                record.sent = self.get_offer(negotiator_id, state, offer)
+                responses[negotiator_id] = SAOResponse(response, record.sent)
+            else:
+                record.sent = [0, self.awi.current_step, 0]
+                responses[negotiator_id] = SAOResponse(response, None)
+        return responses
+
+
+class SyncTestAgent(SyncMode, TestAgent):
+    pass
@@ -0,0 +1,62 @@
+FIRST = 'First'
+
+
+class PartnerState():
+    """What happened so far in the current step's negotiation with one partner"""
+    __slots__ = ("index", "sent", "received", "proposals", "responses", "waits")
+
+    def __init__(self, index):
+        self.index = index
+        self.reset()
+
+    def reset(self):
+        # FIRST means nothing was sent yet (the first offer is still to be made)
+        self.sent = FIRST
+        self.received = None
+        self.proposals = 0
+        self.responses = 0
+        self.waits = 0
+
+
+class NegotiationTable():
+    """
+    The negotiation state with every partner, kept for the whole simulation.
+
+    Records are created once per partner and reset in place every step. The
+    number of partners whose offer is waiting for a response is kept as a
+    counter so checking whether every partner has sent an offer is O(1).
+
+    Args:
+        partners: Ids of the partners.
+    """
+    def __init__(self, partners):
+        self.partners = list(partners)
+        self.records = {p: PartnerState(i) for i, p in enumerate(self.partners)}
+        self.n_received = 0
+
+    def reset(self):
+        """Starts a new step"""
+        for record in self.records.values():
+            record.reset()
+        self.n_received = 0
+
+    def __getitem__(self, partner):
+        return self.records[partner]
+
+    def receive(self, partner, offer):
+        """Records an offer waiting for a response"""
+        record = self.records[partner]
+        if record.received is None:
+            self.n_received += 1
+        record.received = offer
+
+    def answered(self, partner):
+        """Records that the waiting offer of the partner was responded to"""
+        record = self.records[partner]
+        if record.received is not None:
+            self.n_received -= 1
+            record.received = None
+
+    def received_offers(self):
+        """The offers waiting for a response by partner"""
+        return {p: r.received for p, r in self.records.items() if r.received is not None}
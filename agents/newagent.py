@@ -1,6 +1,7 @@
-from agents.bettersyncagent import BetterSyncAgent
+from agents.allocation import redistribute
+from agents.bettersyncagent import BetterSyncAgent, SyncMode
 from agents.strategy import Strategy, StrategyGoldfishParetoAspiration
-from agents.ufuns import BilateralUtilityFunction, OpponentUtilityFunction
+from agents.ufuns import BilateralUtilityFunction, InverseUtilityIndex, OpponentUtilityFunction
 from math import ceil
 from negmas import ResponseType
 from scml.scml2020.common import QUANTITY, TIME, UNIT_PRICE
@@ -10,6 +11,7 @@ class NewAgent(BetterSyncAgent):
     def init(self):
         super().init()
         self.target_q = {nid: 0 for nid in self.partners}
+        self.inverse_ufun = None
         self.debug = False
         
     def before_step(self):
@@ -22,9 +24,15 @@ class NewAgent(BetterSyncAgent):
             self.best_price = self.awi.current_input_issues[2].values[0]
             self.worst_price = self.awi.current_input_issues[2].values[1]
         self.active_partners = self.partners[:]
+        # the ufun is replaced every step so it is inverted once per step
+        try:
+            self.inverse_ufun = InverseUtilityIndex(self.ufun.invert())
+        except ValueError:
+            # the ufun could not be inverted
+            self.inverse_ufun = None
 
     def get_first_offer(self, negotiator_id, state):
-        self.proposal_count[negotiator_id] += 1
+        self.negotiations[negotiator_id].proposals += 1
         offer = [-1]*3
         offer[TIME] = self.awi.current_step
         offer[QUANTITY] = self.target_q[negotiator_id]
@@ -43,21 +51,22 @@ class NewAgent(BetterSyncAgent):
         offer = [-1]*3
         offer[TIME] = self.awi.current_step
         offer[QUANTITY] = self.target_q[negotiator_id]
-        try:
-            offer[UNIT_PRICE] = self.ufun.invert()(1-t/50, True)[2]
-        except:
+        target = self.inverse_ufun.one_at(1-t/50) if self.inverse_ufun is not None else None
+        if target is None:
             offer[UNIT_PRICE] = self.max_price
+        else:
+            offer[UNIT_PRICE] = target[UNIT_PRICE]
         return tuple(offer)
 
     def on_negotiation_failure(self, partners, annotation, mechanism, state):
         other_partner = [p for p in partners if p != str(self.awi.agent)][0]
         self.active_partners.remove(other_partner)
-        i = 0
-        while self.target_q[other_partner] > 0 and len(self.active_partners) > 0:
-            dis_to = self.active_partners[i]
-            self.target_q[dis_to] += 1
-            self.target_q[other_partner] -= 1
-            i = (i + 1) % len(self.active_partners)
+        # spread the quantity over the partners still negotiating. The first
+        # partners get the units that do not divide equally.
+        if self.target_q[other_partner] > 0:
+            active = {p: self.target_q[p] for p in self.active_partners}
+            self.target_q[other_partner] = redistribute(active, self.target_q[other_partner])
+            self.target_q.update(active)
 
     def on_negotiation_success(self, contract, mechanism):
         negotiator_id = contract.annotation[self.partner]
@@ -68,7 +77,7 @@ class NewAgent(BetterSyncAgent):
         offer[QUANTITY] = q
         offer[UNIT_PRICE] = p
         self.q -= q
-        self.accepted_offers[negotiator_id] = tuple(offer)
+        self.set_accepted(negotiator_id, offer)
         self.active_partners.remove(negotiator_id)
         if self.target_q[negotiator_id] > q:
             diff = self.target_q[negotiator_id] - q
@@ -79,3 +88,7 @@ class NewAgent(BetterSyncAgent):
                 diff -= 1
                 i = (i + 1) % len(self.active_partners)
         self.target_q[negotiator_id] = 0
+
+
+class SyncNewAgent(SyncMode, NewAgent):
+    pass
@@ -0,0 +1,54 @@
+class PriceSolver():
+    """
+    Finds prices at which a single offer reaches a utility threshold.
+
+    For a fixed quantity the utility of an offer only moves one way as the
+    price changes. Usually it gets better as the price gets better for us
+    (higher when selling, lower when buying) but selling more than we can
+    produce costs a shortfall penalty that grows with the price. Either way
+    the price is found with a binary search over the integer prices instead
+    of trying them one by one.
+
+    Args:
+        ufc: The UFunCalc of the agent. It is refreshed by the agent every
+             step so the solver can be kept for the whole simulation.
+        output: Whether the offers are for selling the agent's output product.
+    """
+    def __init__(self, ufc, output):
+        self.ufc = ufc
+        self.output = output
+
+    def utility(self, quantity, price):
+        """Utility of a single offer on top of the exogenous contracts"""
+        return self.ufc.from_offers(((quantity, 0, price),), (self.output,))
+
+    def worst_price_above(self, quantity, threshold, min_price, max_price):
+        """
+        The price worst for us (the lowest when selling and the highest when
+        buying) between min_price and max_price at which an offer for
+        quantity has a utility strictly above threshold.
+
+        Returns None if no price in the range reaches the threshold.
+        """
+        # with `good(k)` meaning the k-th price counting from the best one is
+        # above the threshold, find the last good k
+        if self.output:
+            def price(k): return max_price - k
+        else:
+            def price(k): return min_price + k
+        n = max_price - min_price + 1
+        if n <= 0:
+            return None
+        # a good worst price is the answer whichever way utility moves
+        if self.utility(quantity, price(n - 1)) > threshold:
+            return price(n - 1)
+        if not self.utility(quantity, price(0)) > threshold:
+            return None
+        lo, hi = 0, n - 1
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if self.utility(quantity, price(mid)) > threshold:
+                lo = mid
+            else:
+                hi = mid - 1
+        return price(lo)
@@ -0,0 +1,138 @@
+import json
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from functools import wraps
+from pathlib import Path
+
+
+class LatencyHistogram():
+    """Number of calls and a histogram of their latencies"""
+    # upper bounds of the buckets in seconds (10us to 10s in half decades).
+    # Anything slower falls in an extra open bucket.
+    BUCKETS = tuple(10 ** (e / 2) for e in range(-10, 3))
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.counts = [0] * (len(self.BUCKETS) + 1)
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.counts[bisect_left(self.BUCKETS, seconds)] += 1
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile of latencies"""
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return self.BUCKETS[i] if i < len(self.BUCKETS) else self.max
+        return self.max
+
+    def report(self):
+        return dict(
+            count=self.count,
+            total=self.total,
+            mean=self.total / self.count if self.count else 0.0,
+            max=self.max,
+            p50=self.quantile(0.5),
+            p99=self.quantile(0.99),
+            # only the buckets that got calls as [upper bound, count]
+            histogram=[
+                [self.BUCKETS[i] if i < len(self.BUCKETS) else None, n]
+                for i, n in enumerate(self.counts) if n
+            ],
+        )
+
+
+class CallbackProfiler():
+    """
+    Times the callbacks of an agent.
+
+    Latencies are recorded per callback for the whole world, for every
+    simulation step, for every negotiation (a partner in a step) and for every
+    negotiation round. Times are inclusive so the time of `respond` also
+    contains the `get_response` and `get_offer` calls it makes.
+
+    Args:
+        agent: The agent to profile. Its callbacks are replaced with timed
+               versions by `instrument`.
+    """
+    CALLBACKS = (
+        'propose', 'respond', 'get_first_offer', 'get_response', 'get_offer', 'get_diff',
+        'first_proposals', 'counter_all',
+    )
+
+    def __init__(self, agent):
+        self.agent = agent
+        self.callbacks = defaultdict(LatencyHistogram)
+        self.steps = defaultdict(lambda: defaultdict(LatencyHistogram))
+        self.negotiations = defaultdict(lambda: defaultdict(LatencyHistogram))
+        self.rounds = defaultdict(lambda: defaultdict(LatencyHistogram))
+        # negotiators whose callbacks are running. Callbacks that do not get a
+        # negotiator (get_diff) are counted for the innermost one.
+        self._active = []
+
+    def instrument(self, names=CALLBACKS):
+        """Replaces the given methods of the agent with timed versions.
+        Done on the instance so that overrides in subclasses are timed too.
+        Methods the agent does not have are skipped."""
+        for name in names:
+            if not hasattr(self.agent, name):
+                continue
+            setattr(self.agent, name, self._timed(name, getattr(self.agent, name)))
+
+    def _timed(self, name, method):
+        @wraps(method)
+        def timed(*args, **kwargs):
+            nid = args[0] if args and isinstance(args[0], str) else kwargs.get('negotiator_id')
+            state = args[1] if len(args) > 1 else kwargs.get('state')
+            if nid is None and self._active:
+                nid = self._active[-1]
+            self._active.append(nid)
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.record(name, time.perf_counter() - start, nid, getattr(state, 'step', None))
+                self._active.pop()
+        return timed
+
+    def record(self, callback, seconds, negotiator_id=None, round_=None):
+        """Records one call of a callback"""
+        step = self.agent.awi.current_step
+        self.callbacks[callback].add(seconds)
+        self.steps[step][callback].add(seconds)
+        if negotiator_id is not None:
+            self.negotiations[f'{step}:{negotiator_id}'][callback].add(seconds)
+        if round_ is not None:
+            self.rounds[round_][callback].add(seconds)
+
+    def report(self):
+        """All recorded latencies as a JSON serializable dict"""
+        def nested(d):
+            return {str(k): {c: h.report() for c, h in v.items()} for k, v in d.items()}
+
+        return dict(
+            agent=self.agent.id,
+            type=self.agent.__class__.__name__,
+            callbacks={c: h.report() for c, h in self.callbacks.items()},
+            steps=nested(self.steps),
+            negotiations=nested(self.negotiations),
+            rounds=nested(self.rounds),
+        )
+
+    def save(self, path):
+        """Writes the report to <path>/<agent id>.json"""
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        with open(path / f'{self.agent.id}.json', 'w') as f:
+            json.dump(self.report(), f, indent=2)
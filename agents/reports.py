@@ -0,0 +1,65 @@
+import numpy as np
+
+
+class PartnerBalances():
+    """
+    Cash balances of a fixed set of partners taken from the financial reports.
+
+    Each report is fetched once (not once per partner) and only the last
+    `window` reports are kept, in a ring buffer with one column per partner,
+    so memory does not grow with the length of the simulation.
+
+    Args:
+        awi: The AWI of the agent.
+        partners: Ids of the partners to keep balances of.
+        window: Number of reports to keep.
+    Remarks:
+        - Partners missing from a report get nan as their balance.
+    """
+    def __init__(self, awi, partners, window=8):
+        self.awi = awi
+        self.partners = list(partners)
+        self.index = {p: i for i, p in enumerate(self.partners)}
+        self.window = window
+        self.history = np.full((window, len(self.partners)), np.nan)
+        self.steps = [None] * window
+        self.n_reports = 0
+
+    def update(self, step):
+        """Reads the balances of the report at the given step (once)"""
+        if self.n_reports and self.steps[(self.n_reports - 1) % self.window] == step:
+            return
+        reports = self.awi.reports_at_step(step)
+        if not reports:
+            return
+        row = self.n_reports % self.window
+        self.history[row] = [
+            reports[p].cash if p in reports else np.nan for p in self.partners
+        ]
+        self.steps[row] = step
+        self.n_reports += 1
+
+    def __len__(self):
+        return min(self.n_reports, self.window)
+
+    def latest(self):
+        """The balance of every partner in the last report (in partner order)"""
+        if not self.n_reports:
+            raise IndexError("no reports read yet")
+        return self.history[(self.n_reports - 1) % self.window]
+
+    def balance(self, partner):
+        """The balance of the given partner in the last report"""
+        return self.latest()[self.index[partner]]
+
+    def recent(self, n=None):
+        """
+        The balances in the last n (by default all kept) reports.
+
+        Returns:
+            An array of shape (n, number of partners) from the oldest to the
+            newest report.
+        """
+        n = len(self) if n is None else min(n, len(self))
+        rows = [(self.n_reports - n + i) % self.window for i in range(n)]
+        return self.history[rows]
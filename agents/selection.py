@@ -0,0 +1,138 @@
+import time
+import numpy as np
+from scml.scml2020.common import QUANTITY, UNIT_PRICE
+
+
+class SubsetSelector():
+    """
+    Finds the set of offers that is best to accept together.
+
+    Utility is evaluated with a UFunCalc on top of the offers already
+    accepted. It is not additive over offers (production capacity, shortfall
+    and disposal penalties) so candidates are always scored as whole sets.
+
+    - Up to exact_max_offers offers, every subset is scored (exact).
+    - For more offers, the best subsets of a greedy pass and of a dynamic
+      program over the total quantity (the subset with the best total price
+      for every total quantity) are scored and then improved by adding or
+      dropping single offers while time allows.
+
+    Args:
+        ufc: The UFunCalc of the agent.
+        output: Whether the offers are for selling the agent's output product.
+        exact_max_offers: The largest number of offers searched exhaustively.
+        time_budget: Seconds a call may take. When it runs out the best set
+                     found so far is returned.
+    """
+    def __init__(self, ufc, output, exact_max_offers=10, time_budget=0.05):
+        self.ufc = ufc
+        self.output = output
+        self.exact_max_offers = exact_max_offers
+        self.time_budget = time_budget
+
+    def utility(self, offers, chosen, accepted=()):
+        """Utility of accepting the chosen offers (indices) with the accepted ones"""
+        all_offers = tuple(accepted) + tuple(offers[i] for i in chosen)
+        return self.ufc.from_offers(all_offers, (self.output,) * len(all_offers))
+
+    def select(self, offers, accepted=()):
+        """
+        Args:
+            offers: A dict mapping partners to their offers.
+            accepted: Offers already accepted in this step.
+        Returns:
+            The partners whose offers should be accepted and the utility of
+            accepting them (the empty set is a valid answer).
+        """
+        deadline = time.perf_counter() + self.time_budget
+        partners = list(offers.keys())
+        items = [tuple(offers[p]) for p in partners]
+        accepted = tuple(tuple(o) for o in accepted)
+        if len(items) <= self.exact_max_offers:
+            chosen, u = self._exhaustive(items, accepted, deadline)
+        else:
+            chosen, u = self._large(items, accepted, deadline)
+        return [partners[i] for i in sorted(chosen)], u
+
+    def _exhaustive(self, items, accepted, deadline):
+        n = len(items)
+        best, best_u = (), self.utility(items, (), accepted)
+        for mask in range(1, 1 << n):
+            if mask % 64 == 0 and time.perf_counter() > deadline:
+                break
+            chosen = tuple(i for i in range(n) if mask >> i & 1)
+            u = self.utility(items, chosen, accepted)
+            if u > best_u:
+                best, best_u = chosen, u
+        return best, best_u
+
+    def _large(self, items, accepted, deadline):
+        best, best_u = self._greedy(items, accepted, deadline)
+        for chosen in self._by_quantity(items):
+            if time.perf_counter() > deadline:
+                return best, best_u
+            u = self.utility(items, chosen, accepted)
+            if u > best_u:
+                best, best_u = chosen, u
+        return self._improve(items, accepted, best, best_u, deadline)
+
+    def _greedy(self, items, accepted, deadline):
+        """Adds offers from the best price down while utility improves"""
+        sign = -1 if self.output else 1
+        order = sorted(range(len(items)), key=lambda i: sign * items[i][UNIT_PRICE])
+        chosen, best_u = [], self.utility(items, (), accepted)
+        for i in order:
+            if time.perf_counter() > deadline:
+                break
+            u = self.utility(items, chosen + [i], accepted)
+            if u > best_u:
+                chosen.append(i)
+                best_u = u
+        return tuple(chosen), best_u
+
+    def _by_quantity(self, items):
+        """
+        Dynamic program over the total quantity. Finds, for every reachable
+        total quantity, the subset with the best total price (the highest when
+        selling and the lowest when buying).
+
+        Returns:
+            The subsets (as tuples of indices), one per reachable quantity.
+        """
+        qs = np.array([int(o[QUANTITY]) for o in items])
+        values = np.array([o[QUANTITY] * o[UNIT_PRICE] for o in items], dtype=float)
+        if not self.output:
+            values = -values
+        total = int(qs.sum())
+        best = np.full(total + 1, -np.inf)
+        best[0] = 0.0
+        take = np.zeros((len(items), total + 1), dtype=bool)
+        for i, (q, v) in enumerate(zip(qs, values)):
+            with_i = np.full(total + 1, -np.inf)
+            with_i[q:] = best[:total + 1 - q] + v
+            take[i] = with_i > best
+            best = np.where(take[i], with_i, best)
+        subsets = []
+        for quantity in np.flatnonzero(np.isfinite(best)):
+            chosen, left = [], int(quantity)
+            for i in range(len(items) - 1, -1, -1):
+                if take[i, left]:
+                    chosen.append(i)
+                    left -= qs[i]
+            subsets.append(tuple(sorted(chosen)))
+        return subsets
+
+    def _improve(self, items, accepted, chosen, best_u, deadline):
+        """Adds or drops single offers while that improves utility"""
+        chosen = set(chosen)
+        improved = True
+        while improved:
+            improved = False
+            for i in range(len(items)):
+                if time.perf_counter() > deadline:
+                    return tuple(sorted(chosen)), best_u
+                candidate = chosen ^ {i}
+                u = self.utility(items, sorted(candidate), accepted)
+                if u > best_u:
+                    chosen, best_u, improved = candidate, u, True
+        return tuple(sorted(chosen)), best_u
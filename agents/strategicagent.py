@@ -1,30 +1,46 @@
-from agents.bettersyncagent import BetterSyncAgent
+from agents.bettersyncagent import BetterSyncAgent, SyncMode
 from agents.strategy import Strategy, StrategyGoldfishParetoAspiration
-from agents.ufuns import BilateralUtilityFunction, OpponentUtilityFunction
+from agents.ufuns import BilateralUtilityFunction, OpponentUtilityFunction, OpponentUtilityFunctionFactory
 
 class StrategicAgent(BetterSyncAgent):
     def __init__(self) -> None:
         super().__init__()
         self.strategy=Strategy()
+        self.opp_ufuns = OpponentUtilityFunctionFactory()
 
     def est_frac_complete(self, negotiator_id):
-        moves = self.response_count[negotiator_id] + self.proposal_count[negotiator_id]
+        record = self.negotiations[negotiator_id]
+        moves = record.responses + record.proposals
         f = (moves - 0.5) / (2 * self.n_negotiation_rounds)
         return max(0, f)
 
+    def before_step(self):
+        super().before_step()
+        self.my_ufun = None
+
+    def on_negotiation_success(self, contract, mechanism):
+        super().on_negotiation_success(contract, mechanism)
+        if self.my_ufun is not None:
+            negotiator_id = contract.annotation[self.partner]
+            self.my_ufun.add_offer(self.accepted_offers[negotiator_id])
+
     def calculate_ufun(self):
-        other_offers = list(self.accepted_offers.values())
-        return BilateralUtilityFunction(self.ufun, self.awi, other_offers)
+        # the utility function only depends on the accepted offers so it is
+        # built once per step and updated in on_negotiation_success
+        if self.my_ufun is None:
+            other_offers = list(self.accepted_offers.values())
+            self.my_ufun = BilateralUtilityFunction(self.ufun, self.awi, other_offers, ufc=self.ufc)
+        return self.my_ufun
 
     def get_first_offer(self, negotiator_id, state):
         t = self.est_frac_complete(negotiator_id)
         my_ufun = self.calculate_ufun()
-        opp_ufun = OpponentUtilityFunction(1-self.awi.level, self.awi.n_competitors, last_opp_offer=None)
-        self.proposal_count[negotiator_id] += 1
+        opp_ufun = self.opp_ufuns(1-self.awi.level, self.awi.n_competitors, last_opp_offer=None)
+        self.negotiations[negotiator_id].proposals += 1
         return self.strategy.propose(my_ufun, opp_ufun, t)
 
     def get_response(self, negotiator_id, state, offer):
-        self.response_count[negotiator_id] += 1
+        self.negotiations[negotiator_id].responses += 1
         t = self.est_frac_complete(negotiator_id)
         my_ufun = self.calculate_ufun()
         return self.strategy.respond(my_ufun, offer, t)
@@ -32,11 +48,14 @@ class StrategicAgent(BetterSyncAgent):
     def get_offer(self, negotiator_id, state, offer):
         t = self.est_frac_complete(negotiator_id)
         my_ufun = self.calculate_ufun()
-        opp_ufun = OpponentUtilityFunction(1-self.awi.level, self.awi.n_competitors, last_opp_offer=offer)
-        self.proposal_count[negotiator_id] += 1
+        opp_ufun = self.opp_ufuns(1-self.awi.level, self.awi.n_competitors, last_opp_offer=offer)
+        self.negotiations[negotiator_id].proposals += 1
         return self.strategy.propose(my_ufun, opp_ufun, t)
 
 class GPAAgent(StrategicAgent):
     def __init__(self) -> None:
         super().__init__()
-        self.strategy = StrategyGoldfishParetoAspiration()
\ No newline at end of file
+        self.strategy = StrategyGoldfishParetoAspiration()
+
+class SyncGPAAgent(SyncMode, GPAAgent):
+    pass
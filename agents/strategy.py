@@ -1,7 +1,40 @@
 import math
+import numpy as np
+from bisect import bisect_left
 from agents.ufuns import OpponentUtilityFunction
 from negmas import ResponseType
 
+
+def pareto_mask(my_us, opp_us):
+    """
+    Finds the Pareto optimal points given arrays of utilities in O(n log n).
+
+    A point is Pareto optimal if no other point has a higher utility for one
+    side and at least the same utility for the other. Points with identical
+    utilities do not dominate each other so they are all kept.
+
+    Returns:
+        A boolean array that is True for Pareto optimal points.
+    """
+    my_us, opp_us = np.asarray(my_us, dtype=float), np.asarray(opp_us, dtype=float)
+    n = len(my_us)
+    if n == 0:
+        return np.zeros(0, dtype=bool)
+    # sort by my utility then by the opponent utility, both descending
+    order = np.lexsort((-opp_us, -my_us))
+    u, v = my_us[order], opp_us[order]
+    # points with the same utility for me form a group. The first point of each
+    # group has the highest opponent utility in it.
+    starts = np.flatnonzero(np.r_[True, u[1:] != u[:-1]])
+    group = np.cumsum(np.r_[True, u[1:] != u[:-1]]) - 1
+    group_max = v[starts]
+    # the best opponent utility of any point with strictly higher utility for me
+    best_before = np.r_[-np.inf, np.maximum.accumulate(v)[starts[1:] - 1]]
+    is_pareto = (v == group_max[group]) & (group_max[group] > best_before[group])
+    mask = np.empty(n, dtype=bool)
+    mask[order] = is_pareto
+    return mask
+
 class Strategy():
     def __init__(self):
         pass
@@ -12,71 +45,75 @@ class Strategy():
     def respond():
         return NotImplementedError
 
+class FrontierInfo():
+    """Everything proposing needs to know about a Pareto frontier. Frontier
+    offers are kept sorted by my utility so that the offer closest to any
+    target utility is found with a binary search."""
+    def __init__(self, frontier, my_us, nash_point, start_util, end_util):
+        self.frontier = frontier
+        self.nash_point = nash_point
+        self.start_util = start_util
+        self.end_util = end_util
+        order = np.argsort(my_us, kind='stable')
+        self.sorted_offers = [frontier[i] for i in order]
+        self.sorted_utils = [float(my_us[i]) for i in order]
+
+    def offer_above(self, target):
+        """The frontier offer with the lowest utility that is at least target"""
+        i = bisect_left(self.sorted_utils, target)
+        return self.sorted_offers[i] if i < len(self.sorted_offers) else None
+
 class StrategyGoldfishParetoAspiration(Strategy):
     def __init__(self) -> None:
         self.ASP_VAL = 1
         self.NASH_BALANCE = 0.5
+        self.cache = {}
+        self.cache_step = None
 
     def calculate_pareto_frontier(self, my_ufun, opp_ufun):
-        frontier = []
-        my_us = {o: my_ufun(o) for o in my_ufun.offer_set}
-        opp_us = {o: opp_ufun(o) for o in my_ufun.offer_set}
-        for o1 in my_us:
-            is_pareto = True
-            for o2 in my_us:
-                if (my_us[o2] > my_us[o1] and opp_us[o2] >= opp_us[o1]) or (my_us[o2] >= my_us[o1] and opp_us[o2] > opp_us[o1]):
-                    is_pareto = False
-                    break
-            if is_pareto:
-                frontier.append(o1)
-#         for offer1 in my_ufun.offer_set:
-#             my_util1 = my_ufun(offer1)
-#             opp_util1 = opp_ufun(offer1)
-#             is_pareto = True
-#             for offer2 in my_ufun.offer_set:
-#                 my_util2 = my_ufun(offer2)
-#                 opp_util2 = opp_ufun(offer2) 
-#                 if (my_util2 > my_util1 and opp_util2 >= opp_util1) or (my_util2 >= my_util1 and opp_util2 > opp_util1):
-#                     is_pareto = False
-#                     break
-#             if is_pareto:
-#                 frontier.append(offer1)
-        
-        return frontier
+        return self._frontier(my_ufun, opp_ufun)[0]
 
-    def calculate_nash_point(self, my_ufun, opp_ufun, frontier):
-        my_disagreement_util, opp_disagreement_util = my_ufun((0, 0, 0)), opp_ufun((0, 0, 0))
-        max_value = float('-inf')
-        current_best = None
-        for offer in frontier:
-            nash_value = (my_ufun(offer) - my_disagreement_util) * (opp_ufun(offer) - opp_disagreement_util)
-            if nash_value > max_value:
-                current_best = offer
-                max_value = nash_value
+    def _frontier(self, my_ufun, opp_ufun):
+        """The frontier with my and the opponent's utilities of its offers"""
+        offers = my_ufun.offer_set
+        my_us = np.array(my_ufun.utilities(), dtype=float)
+        opp_us = opp_ufun.utility_table(my_ufun.min_price, my_ufun.max_price).ravel()
+        idx = np.flatnonzero(pareto_mask(my_us, opp_us))
+        return [offers[i] for i in idx], my_us[idx], opp_us[idx]
 
-        return current_best if not None else (0, my_ufun.awi.current_step, 0)
+    def frontier_info(self, my_ufun, opp_ufun):
+        """Finds the frontier, Nash point and concession end points once for
+        every set of accepted offers and opponent model in a step"""
+        step = my_ufun.awi.current_step
+        if step != self.cache_step:
+            self.cache = {}
+            self.cache_step = step
+        key = (step, tuple(sorted(tuple(o) for o in my_ufun.offers)), opp_ufun.params)
+        info = self.cache.get(key)
+        if info is not None:
+            return info
 
-    def get_target_utility(self, my_ufun, opp_ufun, frontier, t):
-        curr_asp_level = 1.0 - math.pow(t, self.ASP_VAL)
-        nash_point = self.calculate_nash_point(my_ufun, opp_ufun, frontier)
-        zero_util = my_ufun((0, my_ufun.awi.current_step, 0))
+        frontier, my_us, opp_us = self._frontier(my_ufun, opp_ufun)
+        nash_point = (0, step, 0)
+        if len(frontier) > 0:
+            my_disagreement_util, opp_disagreement_util = my_ufun((0, 0, 0)), opp_ufun((0, 0, 0))
+            nash_values = (my_us - my_disagreement_util) * (opp_us - opp_disagreement_util)
+            nash_point = frontier[int(np.argmax(nash_values))]
+        zero_util = my_ufun((0, step, 0))
         start_util = my_ufun(my_ufun.best_offer)
         end_util = my_ufun(nash_point) * self.NASH_BALANCE + zero_util * (1-self.NASH_BALANCE)
-        target_util = curr_asp_level * start_util + (1-curr_asp_level) * end_util
-        return target_util
+        info = FrontierInfo(frontier, my_us, nash_point, start_util, end_util)
+        self.cache[key] = info
+        return info
 
     def propose(self, my_ufun, opp_ufun, t):
-        frontier = self.calculate_pareto_frontier(my_ufun, opp_ufun)
-        target = self.get_target_utility(my_ufun, opp_ufun, frontier, t)
-
-        best_target_offer = None
-        best_distance = float('inf')
-        for offer in frontier:
-            if my_ufun(offer) >= target and my_ufun(offer) - target < best_distance:
-                best_distance = my_ufun(offer) - target
-                best_target_offer = offer
+        info = self.frontier_info(my_ufun, opp_ufun)
+        curr_asp_level = 1.0 - math.pow(t, self.ASP_VAL)
+        target = curr_asp_level * info.start_util + (1-curr_asp_level) * info.end_util
 
-        return best_target_offer if not None else my_ufun.best_offer
+        best_target_offer = info.offer_above(target)
+        # proposing None would end the negotiation
+        return best_target_offer if best_target_offer is not None else my_ufun.best_offer
 
     def respond(self, my_ufun, opp_offer, t):
         current_util_level = 1.0 - math.pow(t, self.ASP_VAL)
@@ -1,15 +1,89 @@
+from bisect import bisect_left
 from copy import deepcopy
 from typing import Iterable
-from typing import List
 from typing import Optional
 from typing import Tuple
 from typing import Union
-from scml.scml2020.common import QUANTITY, TIME, UNIT_PRICE
+import numpy as np
+from scml.scml2020.common import QUANTITY, UNIT_PRICE
+
+
+def _insert_sorted(qs, ps, n, q, p, descending):
+    """Inserts a contract into the first n slots of the quantity/price buffers
+    keeping them sorted by price after any contract with the same price"""
+    i = n
+    if descending:
+        while i > 0 and ps[i - 1] < p:
+            qs[i], ps[i] = qs[i - 1], ps[i - 1]
+            i -= 1
+    else:
+        while i > 0 and ps[i - 1] > p:
+            qs[i], ps[i] = qs[i - 1], ps[i - 1]
+            i -= 1
+    qs[i], ps[i] = q, p
+
+
+class UFunContext():
+    """
+    The values of a ufun that UFunCalc needs, read once per simulation step.
+
+    Remarks:
+        - A OneShotUFun does not change during a step so there is no need to
+          go back to it (or to recompute exogenous unit prices) for every
+          evaluation. Take a new snapshot with `UFunCalc.refresh` whenever the
+          ufun changes.
+    """
+    __slots__ = (
+        "ex_qin", "ex_unit_pin", "ex_qout", "ex_unit_pout", "n_lines",
+        "production_cost", "disposal_cost", "shortfall_penalty",
+        "input_penalty_scale", "output_penalty_scale", "current_balance",
+        "min_utility", "utility_range",
+    )
+
+    def __init__(self, ufun) -> None:
+        self.ex_qin = ufun.ex_qin
+        self.ex_unit_pin = ufun.ex_pin / ufun.ex_qin if ufun.ex_qin else 0
+        self.ex_qout = ufun.ex_qout
+        self.ex_unit_pout = ufun.ex_pout / ufun.ex_qout if ufun.ex_qout else 0
+        self.n_lines = ufun.n_lines
+        self.production_cost = ufun.production_cost
+        self.disposal_cost = ufun.disposal_cost
+        self.shortfall_penalty = ufun.shortfall_penalty
+        self.input_penalty_scale = ufun.input_penalty_scale
+        self.output_penalty_scale = ufun.output_penalty_scale
+        self.current_balance = ufun.current_balance
+        # filled the first time normalization needs them
+        self.min_utility = None
+        self.utility_range = None
 
 
 class UFunCalc():
+    # offer sets up to this size are evaluated by `_from_few_offers`
+    FAST_PATH_MAX_OFFERS = 10
+
     def __init__(self, ufun) -> None:
         self.ufun = ufun 
+        # preallocated buffers used by `_from_few_offers` (one more slot for
+        # the exogenous contract on each side)
+        n = self.FAST_PATH_MAX_OFFERS + 1
+        self._qs_in, self._ps_in = [0] * n, [0] * n
+        self._qs_out, self._ps_out = [0] * n, [0] * n
+        self.refresh()
+
+    def refresh(self, ufun=None) -> None:
+        """
+        Takes a new snapshot of the ufun values used in calculations.
+
+        Args:
+            ufun: The ufun to use from now on. If not given, the current one is
+                  read again.
+        Remarks:
+            - Call this whenever the ufun changes (i.e. at the beginning of
+              every simulation step).
+        """
+        if ufun is not None:
+            self.ufun = ufun
+        self.context = UFunContext(self.ufun)
 
     def from_offers(
         self, offers: Iterable[Tuple], outputs: Iterable[bool], return_producible=False
@@ -31,6 +105,14 @@ class UFunCalc():
               passed when constructing the ufun.
         """
 
+        if (
+            isinstance(offers, (tuple, list))
+            and isinstance(outputs, (tuple, list))
+            and len(offers) == len(outputs)
+            and len(offers) <= self.FAST_PATH_MAX_OFFERS
+        ):
+            return self._from_few_offers(offers, outputs, return_producible)
+
         def order(x):
             """A helper function to order contracts in the following fashion:
             1. input contracts are ordered from cheapest to most expensive.
@@ -42,20 +124,23 @@ class UFunCalc():
             #     return float("-inf")
             return -offer[UNIT_PRICE] if is_output else offer[UNIT_PRICE]
 
-        # copy inputs because we are going to modify them.
-        offers, outputs = deepcopy(list(offers)), deepcopy(list(outputs))
+        ctx = self.context
+        # copy inputs because we are going to modify them. Offers are made
+        # tuples first (they may be dicts) so that they can be sorted by price.
+        offers = [self.ufun.outcome_as_tuple(o) for o in offers]
+        outputs = deepcopy(list(outputs))
         # indicate that all inputs are not exogenous and that we are adding two
         # exogenous contracts after them.
         exogenous = [False] * len(offers) + [True, True]
         # add exogenous contracts as offers one for input and another for output
         offers += [
-            (self.ufun.ex_qin, 0, self.ufun.ex_pin / self.ufun.ex_qin if self.ufun.ex_qin else 0),
-            (self.ufun.ex_qout, 0, self.ufun.ex_pout / self.ufun.ex_qout if self.ufun.ex_qout else 0),
+            (ctx.ex_qin, 0, ctx.ex_unit_pin),
+            (ctx.ex_qout, 0, ctx.ex_unit_pout),
         ]
         outputs += [False, True]
         # initialize some variables
         qin, qout, pin, pout = 0, 0, 0, 0
-        qin_bar, going_bankrupt = 0, self.ufun.current_balance < 0
+        qin_bar, going_bankrupt = 0, ctx.current_balance < 0
         pout_bar = 0
         # we are going to collect output contracts in output_offers
         output_offers = []
@@ -68,17 +153,16 @@ class UFunCalc():
         # we calculate the total quantity we can actually buy given our limited
         # money balance (`qin_bar`).
         for offer, is_output, is_exogenous in sorted_offers:
-            offer = self.ufun.outcome_as_tuple(offer)
             if is_output:
                 output_offers.append((offer, is_exogenous))
                 continue
             topay_this_time = offer[UNIT_PRICE] * offer[QUANTITY]
             if not going_bankrupt and (
-                pin + topay_this_time + offer[QUANTITY] * self.ufun.production_cost
-                > self.ufun.current_balance
+                pin + topay_this_time + offer[QUANTITY] * ctx.production_cost
+                > ctx.current_balance
             ):
-                unit_total_cost = offer[UNIT_PRICE] + self.ufun.production_cost
-                can_buy = int((self.ufun.current_balance - pin) // unit_total_cost)
+                unit_total_cost = offer[UNIT_PRICE] + ctx.production_cost
+                can_buy = int((ctx.current_balance - pin) // unit_total_cost)
                 qin_bar = qin + can_buy
                 going_bankrupt = True
             pin += topay_this_time
@@ -89,7 +173,7 @@ class UFunCalc():
 
         # calculate the maximum amount we can produce given our limited production
         # capacity and the input we CAN BUY
-        n_lines = self.ufun.n_lines
+        n_lines = ctx.n_lines
         producible = min(qin_bar, n_lines)
 
         # No need to this test now because we test for the ability to produce with
@@ -124,21 +208,21 @@ class UFunCalc():
 
         # we cannot produce more than our capacity or inputs and we should not
         # produce more than our required outputs
-        producible = min(qin, self.ufun.n_lines, producible)
+        producible = min(qin, ctx.n_lines, producible)
 
         # the scale with which to multiply disposal_cost and shortfall_penalty
         # if no scale is given then the unit price will be used.
-        output_penalty = self.ufun.output_penalty_scale
+        output_penalty = ctx.output_penalty_scale
         if output_penalty is None:
             output_penalty = pout / qout if qout else 0
-        output_penalty *= self.ufun.shortfall_penalty * max(0, qout - producible)
-        input_penalty = self.ufun.input_penalty_scale
+        output_penalty *= ctx.shortfall_penalty * max(0, qout - producible)
+        input_penalty = ctx.input_penalty_scale
         if input_penalty is None:
             input_penalty = pin / qin if qin else 0
-        input_penalty *= self.ufun.disposal_cost * max(0, qin - producible)
+        input_penalty *= ctx.disposal_cost * max(0, qin - producible)
 
         # call a helper method giving it the total quantity and money in and out.
-        u = self.ufun.from_aggregates(
+        u = self.from_aggregates(
             qin, qout, producible, pin, pout_bar, input_penalty, output_penalty
         )
         if return_producible:
@@ -148,16 +232,243 @@ class UFunCalc():
         return u
 
 
-def from_aggregates(
+    def _from_few_offers(self, offers, outputs, return_producible=False):
+        """
+        Does the same as `from_offers` for small offer sets without copying
+        the offers or building intermediate lists.
+
+        Remarks:
+            - Contracts are insertion-sorted into preallocated buffers. Insertion
+              keeps the order of contracts with the same price just like the
+              stable sort in `from_offers` does so the result is identical.
+        """
+        ctx = self.context
+        as_tuple = self.ufun.outcome_as_tuple
+        qs_in, ps_in, qs_out, ps_out = self._qs_in, self._ps_in, self._qs_out, self._ps_out
+        n_in = n_out = 0
+
+        for offer, is_output in zip(offers, outputs):
+            # offers may be dicts like in `from_offers`
+            offer = as_tuple(offer)
+            if is_output:
+                _insert_sorted(qs_out, ps_out, n_out, offer[QUANTITY], offer[UNIT_PRICE], True)
+                n_out += 1
+            else:
+                _insert_sorted(qs_in, ps_in, n_in, offer[QUANTITY], offer[UNIT_PRICE], False)
+                n_in += 1
+        # exogenous contracts come last so they go after offers with the same price
+        _insert_sorted(qs_in, ps_in, n_in, ctx.ex_qin, ctx.ex_unit_pin, False)
+        n_in += 1
+        _insert_sorted(qs_out, ps_out, n_out, ctx.ex_qout, ctx.ex_unit_pout, True)
+        n_out += 1
+
+        # from here on this is `from_offers` reading contracts from the buffers
+        qin, qout, pin, pout = 0, 0, 0, 0
+        balance, production_cost = ctx.current_balance, ctx.production_cost
+        qin_bar, going_bankrupt = 0, balance < 0
+        pout_bar = 0
+
+        for i in range(n_in):
+            q, p = qs_in[i], ps_in[i]
+            topay_this_time = p * q
+            if not going_bankrupt and (
+                pin + topay_this_time + q * production_cost > balance
+            ):
+                unit_total_cost = p + production_cost
+                can_buy = int((balance - pin) // unit_total_cost)
+                qin_bar = qin + can_buy
+                going_bankrupt = True
+            pin += topay_this_time
+            qin += q
+
+        if not going_bankrupt:
+            qin_bar = qin
+
+        n_lines = ctx.n_lines
+        producible = min(qin_bar, n_lines)
+
+        done_selling = False
+        for i in range(n_out):
+            q, p = qs_out[i], ps_out[i]
+            if not done_selling:
+                if qout + q >= producible:
+                    assert producible >= qout, f"producible {producible}, qout {qout}"
+                    can_sell = producible - qout
+                    done_selling = True
+                else:
+                    can_sell = q
+                pout_bar += can_sell * p
+            pout += p * q
+            qout += q
+
+        producible = min(producible, qout)
+        producible = min(qin, n_lines, producible)
+
+        output_penalty = ctx.output_penalty_scale
+        if output_penalty is None:
+            output_penalty = pout / qout if qout else 0
+        output_penalty *= ctx.shortfall_penalty * max(0, qout - producible)
+        input_penalty = ctx.input_penalty_scale
+        if input_penalty is None:
+            input_penalty = pin / qin if qin else 0
+        input_penalty *= ctx.disposal_cost * max(0, qin - producible)
+
+        u = self.from_aggregates(
+            qin, qout, producible, pin, pout_bar, input_penalty, output_penalty
+        )
+        if return_producible:
+            return u, producible
+        return u
+
+    def baseline(self, offers: Iterable[Tuple], outputs: Iterable[bool]) -> "OfferBaseline":
+        """
+        Evaluates a fixed set of offers keeping what is needed to find the
+        utility of adding one more offer to them (see `OfferBaseline`).
+        """
+        return OfferBaseline(self, offers, outputs)
+
+    def from_offers_batch(
         self,
-        qin: int,
-        qout_signed: int,
-        qout_sold: int,
-        pin: int,
-        pout: int,
+        offers: Iterable[Tuple],
+        outputs: Iterable[bool],
+        candidates,
+        candidate_output: bool,
+        return_producible=False,
+    ) -> Union[np.ndarray, Tuple[np.ndarray, np.ndarray]]:
+        """
+        Calculates the utility of adding each one of many candidate offers to
+        a fixed set of offers, all in one vectorized pass.
+
+        Args:
+            offers: The fixed (base) offers as in `from_offers`.
+            outputs: Whether each base offer is for output as in `from_offers`.
+            candidates: An (N, 3) array (or anything convertible to one) of
+                        candidate offers (quantity, time, unit price). Time is
+                        ignored.
+            candidate_output: Whether the candidates are offers for buying the
+                              agent's output product.
+            return_producible: If true, the producible quantities will be returned
+        Remarks:
+            - Element i of the result equals
+              `from_offers(list(offers) + [candidates[i]], list(outputs) + [candidate_output])`
+              exactly: contracts are executed in the same order and every
+              arithmetic operation is applied in the same order as the scalar
+              path, only on arrays of length N instead of single numbers.
+        """
+        candidates = np.asarray(candidates, dtype=float).reshape(-1, 3)
+        cq, cp = candidates[:, QUANTITY], candidates[:, UNIT_PRICE]
+        n = len(candidates)
+        ctx = self.context
+
+        # the base offers followed by the two exogenous ones exactly as
+        # `from_offers` builds them. The candidate is appended after the base
+        # offers and before the exogenous ones so, because `sorted` is stable,
+        # it goes after base offers and before exogenous offers of equal price.
+        base = [(self.ufun.outcome_as_tuple(o), is_output, False) for o, is_output in zip(offers, outputs)]
+        base += [
+            ((ctx.ex_qin, 0, ctx.ex_unit_pin), False, True),
+            ((ctx.ex_qout, 0, ctx.ex_unit_pout), True, True),
+        ]
+
+        def side(is_output):
+            """Returns the per-position (quantity, unit price) arrays of the
+            input (or output) contracts in execution order for every candidate."""
+            items = sorted(
+                [(o, e) for o, out, e in base if out == is_output],
+                key=lambda x: -x[0][UNIT_PRICE] if is_output else x[0][UNIT_PRICE],
+            )
+            if candidate_output != is_output:
+                return [(o[QUANTITY], o[UNIT_PRICE]) for o, _ in items]
+            # position of the candidate within the sorted contracts on this side
+            ckey = -cp if is_output else cp
+            pos = np.zeros(n, dtype=int)
+            for o, is_exogenous in items:
+                key = -o[UNIT_PRICE] if is_output else o[UNIT_PRICE]
+                pos += (key < ckey) | ((key == ckey) & (not is_exogenous))
+            bq = np.array([o[QUANTITY] for o, _ in items] + [0], dtype=float)
+            bp = np.array([o[UNIT_PRICE] for o, _ in items] + [0], dtype=float)
+            steps = []
+            for k in range(len(items) + 1):
+                before, at = k < pos, k == pos
+                steps.append((
+                    np.where(before, bq[k], np.where(at, cq, bq[k - 1])),
+                    np.where(before, bp[k], np.where(at, cp, bp[k - 1])),
+                ))
+            return steps
+
+        # the same walk over input contracts as in `from_offers` with one lane
+        # per candidate.
+        pc, balance = ctx.production_cost, ctx.current_balance
+        qin, pin = np.zeros(n), np.zeros(n)
+        qin_bar = np.zeros(n)
+        going_bankrupt = np.full(n, balance < 0)
+        for q, p in side(False):
+            topay_this_time = p * q
+            now = ~going_bankrupt & (pin + topay_this_time + q * pc > balance)
+            if now.any():
+                can_buy = np.floor_divide(balance - pin, p + pc)
+                qin_bar = np.where(now, qin + can_buy, qin_bar)
+                going_bankrupt = going_bankrupt | now
+            pin = pin + topay_this_time
+            qin = qin + q
+        qin_bar = np.where(going_bankrupt, qin_bar, qin)
+
+        n_lines = ctx.n_lines
+        producible = np.minimum(qin_bar, n_lines)
+
+        # the same walk over output contracts as in `from_offers`
+        qout, pout, pout_bar = np.zeros(n), np.zeros(n), np.zeros(n)
+        done_selling = np.zeros(n, dtype=bool)
+        for q, p in side(True):
+            last = qout + q >= producible
+            can_sell = np.where(last, producible - qout, q)
+            pout_bar = np.where(done_selling, pout_bar, pout_bar + can_sell * p)
+            done_selling = done_selling | last
+            pout = pout + p * q
+            qout = qout + q
+
+        producible = np.minimum(producible, qout)
+        producible = np.minimum(np.minimum(qin, n_lines), producible)
+
+        output_penalty = ctx.output_penalty_scale
+        if output_penalty is None:
+            output_penalty = np.where(qout > 0, pout / np.where(qout > 0, qout, 1), 0)
+        output_penalty = output_penalty * (ctx.shortfall_penalty * np.maximum(0, qout - producible))
+        input_penalty = ctx.input_penalty_scale
+        if input_penalty is None:
+            input_penalty = np.where(qin > 0, pin / np.where(qin > 0, qin, 1), 0)
+        input_penalty = input_penalty * (ctx.disposal_cost * np.maximum(0, qin - producible))
+
+        u = self.from_aggregates(
+            qin, qout, producible, pin, pout_bar, input_penalty, output_penalty
+        )
+        if return_producible:
+            return u, producible.astype(int)
+        return u
+
+
+    def utility_range(self) -> Tuple[float, float]:
+        """
+        Returns the minimum utility and the difference between the maximum
+        and minimum utilities, read from the ufun once per snapshot.
+        """
+        ctx = self.context
+        if ctx.utility_range is None:
+            ctx.min_utility = self.ufun.min_utility
+            ctx.utility_range = self.ufun.max_utility - ctx.min_utility
+        return ctx.min_utility, ctx.utility_range
+
+    def from_aggregates(
+        self,
+        qin,
+        qout_signed,
+        qout_sold,
+        pin,
+        pout,
         input_penalty,
         output_penalty,
-    ) -> float:
+        normalized: Optional[bool] = None,
+    ):
         """
         Calculates the utility from aggregates of input/output quantity/prices
 
@@ -171,49 +482,190 @@ def from_aggregates(
             pout: Output total price (i.e. unit price * qin).
             input_penalty: total disposal cost
             output_penalty: total shortfall penalty
+            normalized: If given, overrides whether the ufun is normalized.
 
         Remarks:
-            - Most likely, you do not need to directly call this method. Consider
-              `from_offers` and `from_contracts` that take current balance and
-              exogenous contract information (passed during ufun construction)
-              into account.
-            - The method respects production capacity (n. lines). The
-              agent cannot produce more than the number of lines it has.
+            - Any argument can be a NumPy array in which case an array of
+              utilities is returned (one for each element).
+            - Equivalent to `OneShotUFun.from_aggregates` but reads the ufun
+              values from the current snapshot (see `refresh`).
             - This method does not take exogenous contracts or current balance
               into account.
             - The method assumes that the agent CAN pay for all input
               and production.
 
         """
-        assert qout_sold <= qout_signed, f"sold: {qout_sold}, signed: {qout_signed}"
-
-        # production capacity
-        lines = self.ufun.n_lines
+        ctx = self.context
+        if isinstance(qin, np.ndarray) or isinstance(qout_sold, np.ndarray):
+            assert np.all(qout_sold <= qout_signed), f"sold: {qout_sold}, signed: {qout_signed}"
+            produced = np.minimum(np.minimum(qin, ctx.n_lines), qout_sold)
+        else:
+            assert qout_sold <= qout_signed, f"sold: {qout_sold}, signed: {qout_signed}"
+            # we cannot produce more than our capacity or inputs and we should not
+            # produce more than our required outputs
+            produced = min(qin, ctx.n_lines, qout_sold)
 
-        # we cannot produce more than our capacity or inputs and we should not
-        # produce more than our required outputs
-        produced = min(qin, lines, qout_sold)
-
-        # self explanatory. right?  few notes:
-        # 1. You pay disposal costs for anything that you buy and do not produce
-        #    and sell. Because we know that you sell no more than what you produce
-        #    we can multiply the disposal cost with the difference between input
-        #    quantity and the amount produced
-        # 2. You pay shortfall penalty for anything that you should have sold but
-        #    did not. The only reason you cannot sell something is if you cannot
-        #    produce it. That is why the shortfall penalty is multiplied by the
-        #    difference between what you should have sold and the produced amount.
+        # You pay disposal costs for anything that you buy and do not produce
+        # and sell and shortfall penalty for anything that you should have sold
+        # but did not (see `OneShotUFun.from_aggregates`).
         u = (
             pout
             - pin
-            - self.ufun.production_cost * produced
+            - ctx.production_cost * produced
             - input_penalty
             - output_penalty
         )
-        if not self.ufun.normalized:
+        if normalized is None:
+            normalized = self.ufun.normalized
+        if not normalized:
             return u
         # normalize values between zero and one if needed.
-        rng = self.ufun.max_utility - self.ufun.min_utility
+        min_utility, rng = self.utility_range()
         if rng < 1e-12:
-            return 1.0
-        return (u - self.ufun.min_utility) / rng
\ No newline at end of file
+            return np.ones_like(u, dtype=float) if isinstance(u, np.ndarray) else 1.0
+        return (u - min_utility) / rng
+
+
+class OfferBaseline():
+    """
+    The execution of a fixed set of offers (as in `UFunCalc.from_offers`),
+    kept so that the utility of adding one more offer is found without
+    going over the fixed offers again.
+
+    Contracts on each side are kept in execution order together with the
+    state of the `from_offers` walk before each of them. An added offer
+    starts from the state at its position and only the contracts after it
+    are walked (in the same order and with the same arithmetic), so
+    `with_offer` returns exactly what `from_offers` returns for all the offers.
+
+    Remarks:
+        - Adding an output offer does not change the input side at all. Adding
+          an input offer changes the producible quantity so the output side is
+          walked again (for an agent buying its input it only has the
+          exogenous contract).
+        - The baseline is only valid for the ufun snapshot it was made with.
+
+    Args:
+        calc: The UFunCalc to use.
+        offers: The fixed offers as in `from_offers`.
+        outputs: Whether each offer is for output as in `from_offers`.
+    """
+    def __init__(self, calc, offers, outputs):
+        ctx = calc.context
+        self.calc = calc
+        self.context = ctx
+        ins, outs = [], []
+        for offer, is_output in zip(offers, outputs):
+            offer = calc.ufun.outcome_as_tuple(offer)
+            (outs if is_output else ins).append((offer[QUANTITY], offer[UNIT_PRICE], False))
+        # exogenous contracts go after offers with the same price
+        ins.append((ctx.ex_qin, ctx.ex_unit_pin, True))
+        outs.append((ctx.ex_qout, ctx.ex_unit_pout, True))
+        ins.sort(key=lambda c: c[1])
+        outs.sort(key=lambda c: -c[1])
+        self.ins, self.outs = ins, outs
+        self.in_keys = [p for _, p, _ in ins]
+        self.out_keys = [-p for _, p, _ in outs]
+
+        # state before every input contract and after the last one
+        state = (0, 0, 0, ctx.current_balance < 0)
+        self.in_states = [state]
+        for q, p, _ in ins:
+            state = self._buy(state, q, p)
+            self.in_states.append(state)
+        self.producible = self._producible(state)
+
+        # state before every output contract and after the last one
+        state = (0, 0, 0, False)
+        self.out_states = [state]
+        for q, p, _ in outs:
+            state = self._sell(state, q, p, self.producible)
+            self.out_states.append(state)
+
+        self.utility = self._utility(self.in_states[-1], self.out_states[-1], self.producible)
+
+    @staticmethod
+    def _position(contracts, keys, key):
+        """Where a new offer goes in contracts sorted by keys: after offers
+        with the same key and before exogenous contracts with the same key"""
+        i = bisect_left(keys, key)
+        while i < len(keys) and keys[i] == key and not contracts[i][2]:
+            i += 1
+        return i
+
+    def _buy(self, state, q, p):
+        """The input walk of `from_offers` for one contract"""
+        qin, pin, qin_bar, going_bankrupt = state
+        ctx = self.context
+        topay_this_time = p * q
+        if not going_bankrupt and (
+            pin + topay_this_time + q * ctx.production_cost > ctx.current_balance
+        ):
+            unit_total_cost = p + ctx.production_cost
+            can_buy = int((ctx.current_balance - pin) // unit_total_cost)
+            qin_bar = qin + can_buy
+            going_bankrupt = True
+        return qin + q, pin + topay_this_time, qin_bar, going_bankrupt
+
+    def _producible(self, state):
+        qin, _, qin_bar, going_bankrupt = state
+        return min(qin_bar if going_bankrupt else qin, self.context.n_lines)
+
+    @staticmethod
+    def _sell(state, q, p, producible):
+        """The output walk of `from_offers` for one contract"""
+        qout, pout, pout_bar, done_selling = state
+        if not done_selling:
+            if qout + q >= producible:
+                assert producible >= qout, f"producible {producible}, qout {qout}"
+                can_sell = producible - qout
+                done_selling = True
+            else:
+                can_sell = q
+            pout_bar += can_sell * p
+        return qout + q, pout + p * q, pout_bar, done_selling
+
+    def _utility(self, in_state, out_state, producible):
+        """The end of `from_offers` given the final states of both walks"""
+        ctx = self.context
+        qin, pin, _, _ = in_state
+        qout, pout, pout_bar, _ = out_state
+        producible = min(producible, qout)
+        producible = min(qin, ctx.n_lines, producible)
+
+        output_penalty = ctx.output_penalty_scale
+        if output_penalty is None:
+            output_penalty = pout / qout if qout else 0
+        output_penalty *= ctx.shortfall_penalty * max(0, qout - producible)
+        input_penalty = ctx.input_penalty_scale
+        if input_penalty is None:
+            input_penalty = pin / qin if qin else 0
+        input_penalty *= ctx.disposal_cost * max(0, qin - producible)
+
+        return self.calc.from_aggregates(
+            qin, qout, producible, pin, pout_bar, input_penalty, output_penalty
+        )
+
+    def with_offer(self, offer, is_output):
+        """
+        The utility of the fixed offers and the given one. Equals
+        `from_offers(offers + [offer], outputs + [is_output])`.
+        """
+        offer = self.calc.ufun.outcome_as_tuple(offer)
+        q, p = offer[QUANTITY], offer[UNIT_PRICE]
+        if is_output:
+            i = self._position(self.outs, self.out_keys, -p)
+            state = self._sell(self.out_states[i], q, p, self.producible)
+            for cq, cp, _ in self.outs[i:]:
+                state = self._sell(state, cq, cp, self.producible)
+            return self._utility(self.in_states[-1], state, self.producible)
+
+        i = self._position(self.ins, self.in_keys, p)
+        in_state = self._buy(self.in_states[i], q, p)
+        for cq, cp, _ in self.ins[i:]:
+            in_state = self._buy(in_state, cq, cp)
+        producible = self._producible(in_state)
+        state = self.out_states[0]
+        for cq, cp, _ in self.outs:
+            state = self._sell(state, cq, cp, producible)
+        return self._utility(in_state, state, producible)
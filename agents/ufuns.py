@@ -1,44 +1,111 @@
-from scml.scml2020.common import UNIT_PRICE
+import numpy as np
+import random
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from scml.scml2020.common import QUANTITY, UNIT_PRICE
 from scml.oneshot import OneShotUFun
 from agents.ufuncalc import UFunCalc
 
 class BilateralUtilityFunction():
-    def __init__(self, scmlufun, awi, other_offers):
+    MAX_QUANTITY = 10
+
+    def __init__(self, scmlufun, awi, other_offers, ufc=None):
         self.awi = awi
+        self.min_price = self.awi.current_output_issues[UNIT_PRICE].min_value
+        self.max_price = self.awi.current_output_issues[UNIT_PRICE].max_value
         self.offer_set = []
-        min_price = self.awi.current_output_issues[UNIT_PRICE].min_value
-        max_price = self.awi.current_output_issues[UNIT_PRICE].max_value
-        for q in range(11):
-            for p in range(min_price, max_price+1):
+        for q in range(self.MAX_QUANTITY + 1):
+            for p in range(self.min_price, self.max_price+1):
                 self.offer_set.append((q, awi.current_step, p))
         self.scmlufun = scmlufun
         self.offers = other_offers
+        self.output = self.awi.level == 0
+        self.ufc = ufc if ufc is not None else UFunCalc(self.scmlufun)
+        self.update()
+
+    def update(self):
+        """Recalculates the utility table and best offer from `offers`"""
+        # utility of every offer on the grid indexed by [quantity, price - min_price]
+        self.table = self.ufc.from_offers_batch(
+            [tuple(o) for o in self.offers], [self.output] * len(self.offers),
+            np.array(self.offer_set).reshape(-1, 3), self.output,
+        ).reshape(self.MAX_QUANTITY + 1, -1)
+
+        self.best_offer = (0, self.awi.current_step, 0)
+        if len(self.offer_set) > 0:
+            best = int(np.argmax(self.table))
+            self.best_offer = self.offer_set[best]
+
+    def add_offer(self, offer):
+        """Adds an accepted offer to the other offers and updates the table"""
+        self.offers = list(self.offers) + [tuple(offer)]
+        self.update()
+
+    def utilities(self):
+        """Utilities of the offers in `offer_set` in the same order"""
+        return self.table.ravel()
 
-        self.best_offer = (0, awi.current_step, 0)
-        best_offer_util = float('-inf')
-        for o in self.offer_set:
-            o_util = self.__call__(o)
-            if o_util > best_offer_util:
-                best_offer_util = o_util
-                self.best_offer = o
-                
     def __call__(self, offer):
-        outputs = []
-        if self.awi.level == 0:
-            outputs = [True] * (len(self.offers)+1)
-        else:
-            outputs = [False] * (len(self.offers)+1)
-                
+        q, p = offer[QUANTITY], offer[UNIT_PRICE]
+        if q == int(q) and p == int(p) and 0 <= q <= self.MAX_QUANTITY and self.min_price <= p <= self.max_price:
+            return float(self.table[int(q), int(p) - self.min_price])
+
+        # offers outside the grid are evaluated directly
         all_offers = []
         for o in self.offers:
             all_offers.append(tuple(o))
         all_offers.append(tuple(offer))
+        outputs = [self.output] * len(all_offers)
+        return self.ufc.from_offers(all_offers, outputs)
+
+class InverseUtilityIndex():
+    """
+    Finds outcomes by utility like `ufun.invert()(utility, True)` does but
+    with a bisect instead of a scan over all outcomes.
+
+    The index is built from the inverse negmas caches on the ufun so it has
+    the same outcomes in the same order, with utilities normalized by the
+    ufun itself (between its extreme outcomes).
+
+    Args:
+        inverse: The result of `ufun.invert()`.
+    """
+    # utilities within this distance of the target match it (as in negmas)
+    TOLERANCE = 1e-5
 
-        ufc = UFunCalc(self.scmlufun)
-        utility = ufc.from_offers(all_offers, outputs)
-        return utility
+    def __init__(self, inverse):
+        self.inverse = inverse
+        # negmas keeps the sorted outcomes private. Fail loudly if it stops
+        # doing so instead of finding nothing
+        ordered = getattr(inverse, "_ordered_outcomes", None)
+        if not isinstance(ordered, list) or not getattr(inverse, "_initialized", False):
+            raise TypeError(
+                "InverseUtilityIndex needs an initialized negmas PresortingInverseUtilityFunction "
+                f"(with _ordered_outcomes), got {type(inverse).__name__}"
+            )
+        # sorted by decreasing utility. Negated to be bisected in ascending order
+        self.keys = [-u for u, _ in ordered]
+        self.outcomes = [o for _, o in ordered]
+
+    def one_at(self, utility):
+        """
+        A random outcome whose normalized utility is the given one (within
+        TOLERANCE). Returns None if there is no such outcome.
+        """
+        start = bisect_left(self.keys, -(utility + self.TOLERANCE))
+        end = bisect_right(self.keys, -(utility - self.TOLERANCE))
+        if start >= end:
+            return None
+        return self.outcomes[start + random.randint(0, end - start - 1)]
 
 class OpponentUtilityFunction():
+    """
+    A model of the utility of an opponent.
+
+    Remarks:
+        - Models from `OpponentUtilityFunctionFactory` are shared so neither
+          the model nor its scml_ufun and tables may be modified.
+    """
     EXPECTED_QUANT_TABLE = { 0: 8.9992004, 1: 9.02894599 }
     
     def __init__(self, opp_level, n_competitors, last_opp_offer=None):
@@ -77,5 +144,60 @@ class OpponentUtilityFunction():
             n_output_negs=None,
             current_step=1)
 
+        self.tables = {}
+
+    @property
+    def params(self):
+        """Everything the model depends on"""
+        return (self.level, self.n_partners, self.needed_exog)
+
+    def utility_table(self, min_price, max_price):
+        """Utilities of all offers with quantities 0-10 and the given prices
+        indexed by [quantity, price - min_price]. The table is read only."""
+        key = (min_price, max_price)
+        if key not in self.tables:
+            grid = np.array([
+                (q, 0, p)
+                for q in range(BilateralUtilityFunction.MAX_QUANTITY + 1)
+                for p in range(min_price, max_price + 1)
+            ]).reshape(-1, 3)
+            table = UFunCalc(self.scml_ufun).from_offers_batch(
+                [], [], grid, self.scml_ufun.input_agent
+            ).reshape(BilateralUtilityFunction.MAX_QUANTITY + 1, -1)
+            table.setflags(write=False)
+            self.tables[key] = table
+        return self.tables[key]
+
     def __call__(self, offer):
         return self.scml_ufun(offer)
+
+class OpponentUtilityFunctionFactory():
+    """
+    A bounded LRU cache of opponent models.
+
+    Models are shared between everyone asking for the same parameters so they
+    must not be modified.
+    """
+    def __init__(self, maxsize=64):
+        self.maxsize = maxsize
+        self.models = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, opp_level, n_competitors, last_opp_offer=None):
+        key = (opp_level, n_competitors, last_opp_offer[QUANTITY] if last_opp_offer else None)
+        model = self.models.get(key)
+        if model is not None:
+            self.hits += 1
+            self.models.move_to_end(key)
+            return model
+        self.misses += 1
+        model = OpponentUtilityFunction(opp_level, n_competitors, last_opp_offer=last_opp_offer)
+        self.models[key] = model
+        if len(self.models) > self.maxsize:
+            self.models.popitem(last=False)
+        return model
+
+    def stats(self):
+        """Cache statistics to help sizing the cache"""
+        return dict(hits=self.hits, misses=self.misses, size=len(self.models), maxsize=self.maxsize)
@@ -0,0 +1,302 @@
+"""
+Benchmark of agent decision latency
+
+Drives agents through synthetic negotiation traces without running a world.
+Every trace is a small fake world seen from one agent: a number of partners,
+a price range and a number of offers accepted before the negotiation rounds
+start. The partners send random (but seeded, so the same for every agent)
+offers and the time of every `propose` and `respond` call is recorded.
+Responses that only WAIT for the other partners are cheap so they are
+reported apart ("wait") from the responses that decide ("respond").
+
+Reports p50/p99 latency per agent and trace. Results can be saved as a
+baseline and later runs compared against it to catch regressions.
+
+Usage:
+    python bench_agents.py [--save baseline.json] [--compare baseline.json]
+
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import random
+import time
+from types import SimpleNamespace
+
+import numpy as np
+from negmas import Contract, ResponseType, SAOState, make_issue
+from scml.oneshot import OneShotUFun
+from scml.scml2020.common import QUANTITY, TIME, UNIT_PRICE
+from tier1_agent import SimpleAgent, BetterAgent, AdaptiveAgent, LearningAgent
+from fast_tier1_agent import FastSimpleAgent, FastBetterAgent, FastAdaptiveAgent, FastLearningAgent
+from agents.bettersyncagent import TestAgent
+from agents.newagent import NewAgent
+from agents.strategicagent import GPAAgent
+
+AGENTS = (
+    TestAgent, NewAgent, GPAAgent, SimpleAgent, BetterAgent, AdaptiveAgent, LearningAgent,
+    FastSimpleAgent, FastBetterAgent, FastAdaptiveAgent, FastLearningAgent,
+)
+# "wait" is respond calls that returned WAIT
+CALLBACKS = ("propose", "respond", "wait")
+
+
+class Trace():
+    """
+    A synthetic negotiation trace.
+
+    Args:
+        level: Level of the benchmarked agent (0 sells, 1 buys)
+        n_partners: Number of partners negotiated with
+        price_range: (min, max) unit price of the negotiation issues
+        n_accepted: Number of partners that accept an offer before the first round
+        n_steps: Number of simulation steps to run
+        n_rounds: Number of negotiation rounds in every step
+        seed: Seed of the partner offers
+    """
+    def __init__(self, level, n_partners, price_range, n_accepted, n_steps=2, n_rounds=20, seed=0):
+        self.level = level
+        self.n_partners = n_partners
+        self.price_range = price_range
+        self.n_accepted = n_accepted
+        self.n_steps = n_steps
+        self.n_rounds = n_rounds
+        self.seed = seed
+
+    @property
+    def name(self):
+        mn, mx = self.price_range
+        return f"L{self.level} partners={self.n_partners} prices={mn}-{mx} accepted={self.n_accepted}"
+
+
+def default_traces():
+    return [
+        Trace(level, n_partners, price_range, n_accepted)
+        for level in (0, 1)
+        for n_partners in (2, 4, 8)
+        for price_range in ((10, 20), (5, 50))
+        for n_accepted in (0, n_partners // 2)
+    ]
+
+
+class SyntheticAWI():
+    """The parts of the OneShotAWI used by the agents for a trace"""
+    def __init__(self, trace, agent):
+        self.trace = trace
+        self.agent = agent
+        self.level = trace.level
+        self.n_steps = trace.n_steps
+        self.current_step = 0
+        self.settings = {"neg_n_steps": trace.n_rounds}
+        me = [f"{i:02d}Me@{trace.level}" for i in range(trace.n_partners)]
+        self.partners = [f"{i:02d}P@{1 - trace.level}" for i in range(trace.n_partners)]
+        if trace.level == 0:
+            self.all_consumers = [me, self.partners, ["BUYER"]]
+            self.my_consumers, self.my_suppliers = self.partners, ["SELLER"]
+        else:
+            self.all_consumers = [self.partners, me, ["BUYER"]]
+            self.my_consumers, self.my_suppliers = ["BUYER"], self.partners
+        self.n_competitors = len(me) - 1
+        self.my_input_product = trace.level
+        self.my_output_product = trace.level + 1
+        self.issues = [
+            make_issue((1, 10), "quantity"),
+            make_issue((0, 0), "time"),
+            make_issue(trace.price_range, "unit_price"),
+        ]
+        self.current_input_issues = self.current_output_issues = self.issues
+        self.exogenous_quantity = 10
+        self.exogenous_contract_summary = [(5 * trace.n_partners, 10), (0, 0), (5 * trace.n_partners, 30)]
+
+    @property
+    def current_exogenous_input_quantity(self):
+        return self.exogenous_quantity if self.level == 0 else 0
+
+    @property
+    def current_exogenous_output_quantity(self):
+        return self.exogenous_quantity if self.level == 1 else 0
+
+    def state(self):
+        return SimpleNamespace(
+            exogenous_input_quantity=self.current_exogenous_input_quantity,
+            exogenous_output_quantity=self.current_exogenous_output_quantity,
+        )
+
+    def reports_at_step(self, step):
+        return {p: SimpleNamespace(cash=1000 + 100 * i) for i, p in enumerate(self.partners)}
+
+    def make_ufun(self):
+        """A ufun similar to the one an agent gets in a one-shot world"""
+        q, mn, mx = self.exogenous_quantity, *self.trace.price_range
+        level = self.level
+        return OneShotUFun(
+            ex_pin=10 * q if level == 0 else 0, ex_qin=q if level == 0 else 0,
+            ex_pout=30 * q if level == 1 else 0, ex_qout=q if level == 1 else 0,
+            input_product=level, input_agent=level == 0, output_agent=level == 1,
+            production_cost=2.5, disposal_cost=0.1, shortfall_penalty=0.6,
+            input_penalty_scale=None, output_penalty_scale=None,
+            n_input_negs=self.trace.n_partners if level == 1 else 1,
+            n_output_negs=self.trace.n_partners if level == 0 else 1,
+            input_qrange=(1, 10), output_qrange=(1, 10),
+            input_prange=(mn, mx), output_prange=(mn, mx),
+            current_step=self.current_step, current_balance=1000,
+        )
+
+    def nmi(self, partner):
+        if self.level == 0:
+            annotation = dict(seller=str(self.agent.id), buyer=partner, product=self.my_output_product)
+        else:
+            annotation = dict(seller=partner, buyer=str(self.agent.id), product=self.my_input_product)
+        return SimpleNamespace(issues=self.issues, annotation=annotation, n_steps=self.trace.n_rounds)
+
+
+def random_offer(rng, trace, step):
+    offer = [-1] * 3
+    offer[QUANTITY] = rng.randint(1, 10)
+    offer[TIME] = step
+    offer[UNIT_PRICE] = rng.randint(*trace.price_range)
+    return tuple(offer)
+
+
+def connect(agent_type, trace):
+    """
+    Creates an agent of agent_type connected to a SyntheticAWI of the trace.
+
+    Returns:
+        The agent, its AWI and the NMIs of its negotiations by partner.
+    """
+    agent = agent_type()
+    awi = SyntheticAWI(trace, agent)
+    nmis = {p: awi.nmi(p) for p in awi.partners}
+    ufun = awi.make_ufun()
+    # the adapter of a one-shot world connects its agent with its AWI and ufun
+    agent.connect_to_oneshot_adapter(SimpleNamespace(_awi=awi, ufun=ufun))
+    agent.set_preferences(ufun)
+    agent.get_nmi = lambda partner: nmis[partner]
+    return agent, awi, nmis
+
+
+def run_trace(agent_type, trace):
+    """Returns the latencies (in seconds) of every call of every callback
+    (respond calls that returned WAIT are under "wait")"""
+    rng = random.Random(trace.seed)
+    agent, awi, nmis = connect(agent_type, trace)
+    latencies = {c: [] for c in CALLBACKS}
+
+    agent.init()
+    for step in range(trace.n_steps):
+        awi.current_step = step
+        # the ufun is replaced every step
+        agent.set_preferences(awi.make_ufun())
+        agent.before_step()
+        for partner in awi.partners[:trace.n_accepted]:
+            offer = random_offer(rng, trace, step)
+            annotation = nmis[partner].annotation
+            contract = Contract(
+                agreement=dict(quantity=offer[QUANTITY], time=step, unit_price=offer[UNIT_PRICE]),
+                annotation=annotation, partners=[annotation["buyer"], annotation["seller"]],
+            )
+            agent.on_negotiation_success(contract, nmis[partner])
+
+        active = awi.partners[trace.n_accepted:]
+        for round in range(trace.n_rounds):
+            state = SAOState(running=True, step=round, time=float(round),
+                             relative_time=round / trace.n_rounds)
+            for partner in list(active):
+                start = time.perf_counter()
+                agent.propose(partner, state)
+                latencies["propose"].append(time.perf_counter() - start)
+
+                offer = random_offer(rng, trace, step)
+                start = time.perf_counter()
+                response = agent.respond(partner, state, offer)
+                elapsed = time.perf_counter() - start
+                latencies["wait" if response == ResponseType.WAIT else "respond"].append(elapsed)
+                # finished negotiations get no more calls
+                if response in (ResponseType.ACCEPT_OFFER, ResponseType.END_NEGOTIATION):
+                    active.remove(partner)
+        agent.step()
+    return latencies
+
+
+def run(agent_types=AGENTS, traces=None):
+    """
+    Runs every agent through every trace.
+
+    Returns:
+        A dict mapping "<agent>|<trace>" to the number of calls and p50/p99
+        latency in microseconds of every callback.
+    """
+    traces = default_traces() if traces is None else traces
+    results = {}
+    for agent_type in agent_types:
+        for trace in traces:
+            # some agents print while negotiating
+            with contextlib.redirect_stdout(io.StringIO()):
+                latencies = run_trace(agent_type, trace)
+            results[f"{agent_type.__name__}|{trace.name}"] = {
+                c: dict(
+                    n=len(l),
+                    p50=float(np.percentile(l, 50)) * 1e6 if l else 0.0,
+                    p99=float(np.percentile(l, 99)) * 1e6 if l else 0.0,
+                )
+                for c, l in latencies.items()
+            }
+    return results
+
+
+def print_results(results, baseline=None, tolerance=0.5, min_slowdown=20.0):
+    """
+    Prints the results marking p99 latencies more than tolerance (relative)
+    and min_slowdown microseconds slower than the baseline. The absolute
+    limit keeps timer noise on calls of a few microseconds from showing up.
+    """
+    print(f"{'agent':>14} {'trace':<45}" + "".join(f"{c + ' p50/p99 (us)':>28}" for c in CALLBACKS))
+    regressions = []
+    for key, r in results.items():
+        agent, trace = key.split("|")
+        line = f"{agent:>14} {trace:<45}"
+        for c in CALLBACKS:
+            mark = ""
+            # baselines saved before WAIT responses were split have no "wait"
+            if baseline is not None and c in baseline.get(key, {}) and baseline[key][c]["p99"] > 0:
+                ratio = r[c]["p99"] / baseline[key][c]["p99"]
+                slowdown = r[c]["p99"] - baseline[key][c]["p99"]
+                if ratio > 1 + tolerance and slowdown > min_slowdown:
+                    mark = f" !x{ratio:.1f}"
+                    regressions.append((key, c, ratio))
+            line += f"{r[c]['p50']:>12.1f}/{r[c]['p99']:<10.1f}{mark:>6}"
+        print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark agent propose/respond latency")
+    parser.add_argument("--save", help="save the results as a baseline to this file")
+    parser.add_argument("--compare", help="compare the results with the baseline in this file")
+    parser.add_argument("--tolerance", type=float, default=0.5,
+                        help="relative p99 slowdown reported as a regression")
+    parser.add_argument("--min-slowdown", type=float, default=20.0,
+                        help="smallest p99 slowdown in microseconds reported as a regression")
+    parser.add_argument("--agents", nargs="*", help="names of the agents to benchmark")
+    args = parser.parse_args()
+
+    agent_types = AGENTS if not args.agents else [a for a in AGENTS if a.__name__ in args.agents]
+    results = run(agent_types)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    regressions = print_results(results, baseline, args.tolerance, args.min_slowdown)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if regressions:
+        print(f"{len(regressions)} regressions against {args.compare}")
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Micro-benchmark for UFunCalc.from_offers
+
+Compares the general path of `UFunCalc.from_offers` with the fast path used
+for small offer sets. Reports time per call and memory allocated per call
+(measured with tracemalloc).
+
+Usage:
+    python bench_ufuncalc.py [n_calls]
+
+"""
+
+import random
+import sys
+import time
+import tracemalloc
+
+from scml.oneshot import OneShotUFun
+from agents.ufuncalc import UFunCalc
+
+
+def make_ufun():
+    """A ufun similar to the one a level 0 agent gets in a one-shot world"""
+    return OneShotUFun(
+        ex_pin=100, ex_qin=10, ex_pout=0, ex_qout=0,
+        input_product=0, input_agent=True, output_agent=False,
+        production_cost=2.5, disposal_cost=0.1, shortfall_penalty=0.6,
+        input_penalty_scale=None, output_penalty_scale=None,
+        n_input_negs=4, n_output_negs=4,
+        input_qrange=(1, 10), output_qrange=(1, 10),
+        input_prange=(10, 20), output_prange=(15, 30),
+        current_step=0, current_balance=1000,
+    )
+
+
+def make_offer_sets(n_sets, seed=0):
+    rng = random.Random(seed)
+    sets = []
+    for _ in range(n_sets):
+        n = rng.randint(1, UFunCalc.FAST_PATH_MAX_OFFERS)
+        offers = tuple((rng.randint(0, 10), 0, rng.randint(15, 30)) for _ in range(n))
+        sets.append((offers, (True,) * n))
+    return sets
+
+
+def measure(calc, offer_sets):
+    """Returns (microseconds per call, bytes allocated per call)"""
+    start = time.perf_counter()
+    for offers, outputs in offer_sets:
+        calc.from_offers(offers, outputs)
+    elapsed = time.perf_counter() - start
+
+    allocated = 0
+    tracemalloc.start()
+    for offers, outputs in offer_sets:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        calc.from_offers(offers, outputs)
+        allocated += tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    return 1e6 * elapsed / len(offer_sets), allocated / len(offer_sets)
+
+
+def main(n_calls=20000):
+    ufun = make_ufun()
+    offer_sets = make_offer_sets(n_calls)
+
+    general = UFunCalc(ufun)
+    general.FAST_PATH_MAX_OFFERS = -1
+    fast = UFunCalc(ufun)
+
+    for (offers, outputs) in offer_sets[:1000]:
+        assert general.from_offers(offers, outputs) == fast.from_offers(offers, outputs)
+
+    for name, calc in (("general", general), ("fast path", fast)):
+        us, nbytes = measure(calc, offer_sets)
+        print(f"{name:>10}: {us:8.2f} us/call {nbytes:10.1f} bytes allocated/call")
+
+
+if __name__ == '__main__':
+    main(*[int(_) for _ in sys.argv[1:2]])
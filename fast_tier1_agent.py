@@ -0,0 +1,290 @@
+"""
+CS1440/CS2440 Negotiation Final Project
+
+File with faster versions of the Tier 1 Agents.
+
+The agents in tier1_agent.py must not be modified so the optimizations live
+here as mixins. Every Fast* agent behaves exactly like the agent it is based
+on (same offers and responses for the same inputs), it just does less work
+per message.
+
+"""
+
+from negmas import ResponseType
+from scml.oneshot import *
+
+from tier1_agent import SimpleAgent, BetterAgent, AdaptiveAgent, LearningAgent
+
+
+def _high(a, b):
+    """max(a, b) ignoring nan like max([a, b]) does when a is not nan"""
+    return b if a != a or b > a else a
+
+
+def _low(a, b):
+    """min(a, b) ignoring nan like min([a, b]) does when a is not nan"""
+    return b if a != a or b < a else a
+
+
+class ConcessionSchedule():
+    """
+    The threshold of `BetterAgent._th` for every step of a negotiation.
+
+    Args:
+        n_steps: Number of steps of the negotiation.
+        e: Concession exponent.
+    """
+    def __init__(self, n_steps, e):
+        self.n_steps = n_steps
+        self.e = e
+        self.thresholds = [self._th(step) for step in range(n_steps)] if n_steps > 1 else []
+
+    def _th(self, step):
+        return ((self.n_steps - step - 1) / (self.n_steps - 1)) ** self.e
+
+    def __call__(self, step):
+        if 0 <= step < len(self.thresholds):
+            return self.thresholds[step]
+        return self._th(step)
+
+
+class ScheduledConcession():
+    """Looks thresholds up in a schedule built once per negotiation length
+    instead of computing a power on every message"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._schedules = dict()
+
+    def _th(self, step, n_steps):
+        schedule = self._schedules.get(n_steps)
+        if schedule is None:
+            schedule = self._schedules[n_steps] = ConcessionSchedule(n_steps, self._e)
+        return schedule(step)
+
+
+class NegotiationInfo():
+    """
+    What the tier 1 agents read from the NMI of a negotiation.
+
+    Args:
+        nmi: The NMI of the negotiation.
+        selling: Whether the agent sells its output product in it.
+    """
+    __slots__ = ("selling", "partner", "min_quantity", "max_quantity", "min_price", "max_price", "n_steps")
+
+    def __init__(self, nmi, selling):
+        quantity_issue = nmi.issues[QUANTITY]
+        unit_price_issue = nmi.issues[UNIT_PRICE]
+        self.selling = selling
+        self.partner = nmi.annotation["buyer" if selling else "seller"]
+        self.min_quantity = quantity_issue.min_value
+        self.max_quantity = quantity_issue.max_value
+        self.min_price = unit_price_issue.min_value
+        self.max_price = unit_price_issue.max_value
+        self.n_steps = nmi.n_steps
+
+
+class NegotiationInfoCache():
+    """
+    Keeps a `NegotiationInfo` per negotiation so callbacks look the NMI up
+    once instead of every time they need the issues or the annotation.
+
+    Infos are created the first time a negotiation shows up and dropped in
+    `step` since every simulation step has new negotiations.
+    """
+    def init(self):
+        super().init()
+        self._infos = dict()
+
+    def step(self):
+        super().step()
+        self._infos.clear()
+
+    def _info(self, negotiator_id):
+        """The info of the negotiation or None if there is no NMI for it"""
+        info = self._infos.get(negotiator_id)
+        if info is None:
+            nmi = self.get_nmi(negotiator_id)
+            if not nmi:
+                return None
+            info = self._infos[negotiator_id] = NegotiationInfo(nmi, self._is_selling(nmi))
+        return info
+
+    def best_offer(self, negotiator_id):
+        my_needs = self._needed(negotiator_id)
+        if my_needs <= 0:
+            return None
+        info = self._info(negotiator_id)
+        if info is None:
+            return None
+        offer = [-1] * 3
+        offer[QUANTITY] = max(min(my_needs, info.max_quantity), info.min_quantity)
+        offer[TIME] = self.awi.current_step
+        offer[UNIT_PRICE] = info.max_price if info.selling else info.min_price
+        return tuple(offer)
+
+
+class CachedPriceChecks(NegotiationInfoCache):
+    """
+    `BetterAgent` callbacks working from the cached `NegotiationInfo`.
+
+    The price helpers (`_price_range`, `_is_good_price` and
+    `_find_good_price`) take the info instead of the NMI. Subclasses see
+    every received offer in `_on_offer`.
+    """
+    def propose(self, negotiator_id, state):
+        offer = self.best_offer(negotiator_id)
+        if not offer:
+            return None
+        offer = list(offer)
+        offer[UNIT_PRICE] = self._find_good_price(self._info(negotiator_id), state)
+        return tuple(offer)
+
+    def respond(self, negotiator_id, state, offer):
+        info = self._info(negotiator_id)
+        my_needs = self._needed(negotiator_id)
+        if my_needs <= 0:
+            response = ResponseType.END_NEGOTIATION
+        elif offer[QUANTITY] > my_needs or not self._is_good_price(info, state, offer[UNIT_PRICE]):
+            response = ResponseType.REJECT_OFFER
+        else:
+            response = ResponseType.ACCEPT_OFFER
+        self._on_offer(info, offer)
+        return response
+
+    def _on_offer(self, info, offer):
+        """Called with every offer received after responding to it"""
+
+    def _is_good_price(self, info, state, price):
+        mn, mx = self._price_range(info)
+        th = self._th(state.step, info.n_steps)
+        if info.selling:
+            return (price - mn) >= th * (mx - mn)
+        return (mx - price) >= th * (mx - mn)
+
+    def _find_good_price(self, info, state):
+        mn, mx = self._price_range(info)
+        th = self._th(state.step, info.n_steps)
+        if info.selling:
+            return mn + th * (mx - mn)
+        return mx - th * (mx - mn)
+
+    def _price_range(self, info):
+        return info.min_price, info.max_price
+
+
+class CachedBestPrices(CachedPriceChecks):
+    """`AdaptiveAgent` callbacks working from the cached `NegotiationInfo`"""
+    def _on_offer(self, info, offer):
+        super()._on_offer(info, offer)
+        if info.selling:
+            self._best_selling = max(offer[UNIT_PRICE], self._best_selling)
+        else:
+            self._best_buying = min(offer[UNIT_PRICE], self._best_buying)
+
+    def _price_range(self, info):
+        mn, mx = info.min_price, info.max_price
+        if info.selling:
+            mn = max(mn, self._best_selling)
+        else:
+            mx = min(mx, self._best_buying)
+        return mn, mx
+
+
+class CachedPartnerPrices(CachedBestPrices):
+    """`LearningAgent` callbacks working from the cached `NegotiationInfo`.
+    Used with `IncrementalPriceBounds` which provides `_price_range`."""
+    def _on_offer(self, info, offer):
+        super()._on_offer(info, offer)
+        if info.selling:
+            self._best_opp_selling[info.partner] = max(offer[UNIT_PRICE], self._best_selling)
+        else:
+            self._best_opp_buying[info.partner] = min(offer[UNIT_PRICE], self._best_buying)
+
+
+class IncrementalPriceBounds():
+    """
+    Keeps the slack-adjusted price limits of `LearningAgent._price_range`
+    instead of rebuilding them for every message.
+
+    The limits are kept in two parts: one for the whole step (best price
+    received and agreed on in any negotiation) and one per partner (best price
+    received from and agreed with that partner). A part is dropped when a
+    price it depends on may have changed and is calculated again the next
+    time it is needed.
+
+    Works on the `NegotiationInfo` of `CachedPartnerPrices`.
+    """
+    def init(self):
+        super().init()
+        self._step_bounds = None
+        self._partner_bounds = dict()
+
+    def _bounds(self, partner):
+        """The (selling, buying) limits for the step and for the partner"""
+        step_bounds = self._step_bounds
+        if step_bounds is None:
+            step_bounds = self._step_bounds = (
+                _high(self._best_selling * (1 - self._step_price_slack),
+                      self._best_acc_selling * (1 - self._acc_price_slack)),
+                _low(self._best_buying * (1 + self._step_price_slack),
+                     self._best_acc_buying * (1 + self._acc_price_slack)),
+            )
+        partner_bounds = self._partner_bounds.get(partner)
+        if partner_bounds is None:
+            partner_bounds = self._partner_bounds[partner] = (
+                _high(self._best_opp_selling[partner] * (1 - self._opp_price_slack),
+                      self._best_opp_acc_selling[partner] * (1 - self._opp_acc_price_slack)),
+                _low(self._best_opp_buying[partner] * (1 + self._opp_price_slack),
+                     self._best_opp_acc_buying[partner] * (1 + self._opp_acc_price_slack)),
+            )
+        return step_bounds, partner_bounds
+
+    def before_step(self):
+        super().before_step()
+        self._step_bounds = None
+
+    def step(self):
+        super().step()
+        # best received prices of every partner are reset
+        self._partner_bounds.clear()
+
+    def on_negotiation_success(self, contract, mechanism):
+        super().on_negotiation_success(contract, mechanism)
+        self._step_bounds = None
+        self._partner_bounds.pop(contract.annotation["buyer" if self._is_selling(mechanism) else "seller"], None)
+
+    def _on_offer(self, info, offer):
+        super()._on_offer(info, offer)
+        # the best prices received in the step and from this partner
+        self._step_bounds = None
+        self._partner_bounds.pop(info.partner, None)
+
+    def _price_range(self, info):
+        mn, mx = info.min_price, info.max_price
+        if info.selling:
+            (step_bound, _), (partner_bound, _) = self._bounds(info.partner)
+            mn = min(mx * (1 - self._range_slack), _high(_high(mn, step_bound), partner_bound))
+        else:
+            (_, step_bound), (_, partner_bound) = self._bounds(info.partner)
+            mx = max(mn * (1 + self._range_slack), _low(_low(mx, step_bound), partner_bound))
+        return mn, mx
+
+
+class FastSimpleAgent(NegotiationInfoCache, SimpleAgent):
+    """SimpleAgent with cached negotiation info"""
+
+
+class FastBetterAgent(CachedPriceChecks, ScheduledConcession, BetterAgent):
+    """BetterAgent with cached negotiation info and a precompiled concession
+    schedule"""
+
+
+class FastAdaptiveAgent(CachedBestPrices, ScheduledConcession, AdaptiveAgent):
+    """AdaptiveAgent with cached negotiation info and a precompiled concession
+    schedule"""
+
+
+class FastLearningAgent(IncrementalPriceBounds, CachedPartnerPrices, ScheduledConcession, LearningAgent):
+    """LearningAgent with cached negotiation info, a precompiled concession
+    schedule and cached price bounds"""
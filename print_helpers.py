@@ -9,8 +9,11 @@ Helper file to print simulations
 """
 
 from collections import defaultdict
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import random
 
+import numpy as np
 from matplotlib import pyplot as plt
 from scml.oneshot import *
 from scml.scml2020 import is_system_agent
@@ -22,39 +25,111 @@ def try_agent(agent_type, n_processes=2):
     return try_agents([RandomOneShotAgent, agent_type], n_processes)
 
 
-def try_agents(agent_types, n_processes=2, n_trials=1, draw=True, agent_params=None):
+@contextmanager
+def seeded_random(seed=None):
     """
-    Runs a simulation with the given agent_types, and n_processes n_trial times.
-    Optionally also draws a graph showing what happened
+    Seeds `random` and `numpy.random` for the duration of the block and puts
+    their previous states back when it ends. Does nothing if seed is None.
+
+    Remarks:
+        - scml generates and runs worlds with the global random generators so
+          they have to be seeded (there is no generator to pass down). Restoring
+          them keeps a seeded trial from changing the random numbers of
+          whatever runs after it in the same process.
     """
-    type_scores = defaultdict(float)
-    counts = defaultdict(int)
-    agent_scores = dict()
-    for _ in range(n_trials):
+    if seed is None:
+        yield
+        return
+    state, np_state = random.getstate(), np.random.get_state()
+    random.seed(seed)
+    np.random.seed(seed % 2**32)
+    try:
+        yield
+    finally:
+        random.setstate(state)
+        np.random.set_state(np_state)
+
+
+def run_trial(agent_types, n_processes=2, agent_params=None, construct_graphs=False, seed=None):
+    """
+    Runs one world simulation with the given agent_types.
+
+    If seed is given, the world is generated and run with seeded random
+    generators (see `seeded_random`).
+
+    Returns the world and a list of (agent id, world id, agent type, score,
+    bankrupt) for every non-system agent in it.
+    """
+    with seeded_random(seed):
         p = n_processes if isinstance(n_processes, int) else random.randint(*n_processes)
         world = SCML2020OneShotWorld(
         **SCML2020OneShotWorld.generate(agent_types, agent_params=agent_params, n_steps=10,
                                         n_processes=p, random_agent_types=True),
-        construct_graphs=True,
+        construct_graphs=construct_graphs,
         )
         world.run()
 
-        all_scores = world.scores()
-        for aid, agent in world.agents.items():
-            if is_system_agent(aid):
-                continue
-            key = aid if n_trials == 1 else f"{aid}@{world.id[:4]}"
+    all_scores = world.scores()
+    scores = []
+    for aid, agent in world.agents.items():
+        if is_system_agent(aid):
+            continue
+        scores.append((
+            aid,
+            world.id,
+            agent.type_name.split(':')[-1].split('.')[-1],
+            all_scores[aid],
+            world.is_bankrupt[aid],
+        ))
+    return world, scores
+
+
+def _trial_scores(*args):
+    """Runs a trial in a worker process sending back only the scores"""
+    return run_trial(*args)[1]
+
+
+def try_agents(agent_types, n_processes=2, n_trials=1, draw=True, agent_params=None, n_workers=None):
+    """
+    Runs a simulation with the given agent_types, and n_processes n_trial times.
+    Optionally also draws a graph showing what happened
+
+    If n_workers is given, trials run in that many worker processes. Only the
+    last trial runs in this process (and is returned) when drawing.
+    """
+    type_scores = defaultdict(float)
+    counts = defaultdict(int)
+    agent_scores = dict()
+
+    def collect(scores):
+        for aid, world_id, type_, score, bankrupt in scores:
+            key = aid if n_trials == 1 else f"{aid}@{world_id[:4]}"
             agent_scores[key] = (
-                 agent.type_name.split(':')[-1].split('.')[-1],
-                 all_scores[aid],
-                 '(bankrupt)' if world.is_bankrupt[aid] else ''
+                 type_,
+                 score,
+                 '(bankrupt)' if bankrupt else ''
                 )
-        for aid, agent in world.agents.items():
-            if is_system_agent(aid):
-                continue
-            type_ = agent.type_name.split(':')[-1].split('.')[-1]
-            type_scores[type_] += all_scores[aid]
+            type_scores[type_] += score
             counts[type_] += 1
+
+    world = None
+    if n_workers is None:
+        for i in range(n_trials):
+            # graphs are only needed for the world we draw
+            world, scores = run_trial(agent_types, n_processes, agent_params, draw and i == n_trials - 1)
+            collect(scores)
+    else:
+        n_remote = n_trials - 1 if draw else n_trials
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            future_results = [
+                executor.submit(_trial_scores, agent_types, n_processes, agent_params, False, random.randrange(2**63))
+                for _ in range(n_remote)
+            ]
+            if draw:
+                world, scores = run_trial(agent_types, n_processes, agent_params, True)
+                collect(scores)
+            for future in as_completed(future_results):
+                collect(future.result())
     type_scores = {k: v/counts[k] if counts[k] else v for k, v in type_scores.items()}
     if draw:
         world.draw(
@@ -67,6 +142,109 @@ def try_agents(agent_types, n_processes=2, n_trials=1, draw=True, agent_params=N
     return world, agent_scores, type_scores
 
 
+class TypeScoreStats():
+    """
+    Running statistics of the scores of one agent type.
+
+    Mean and variance are updated with Welford's algorithm so memory does not
+    grow with the number of scores. Optionally keeps a uniform random sample
+    (reservoir) of at most reservoir_size individual scores.
+    """
+    def __init__(self, reservoir_size=0, rng=None):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.n_bankrupt = 0
+        self.reservoir_size = reservoir_size
+        self.reservoir = []
+        self._rng = rng if rng is not None else random.Random()
+
+    def add(self, key, score, bankrupt=False):
+        self.count += 1
+        delta = score - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (score - self.mean)
+        self.n_bankrupt += int(bool(bankrupt))
+        if self.reservoir_size <= 0:
+            return
+        if len(self.reservoir) < self.reservoir_size:
+            self.reservoir.append((key, score, bankrupt))
+        else:
+            i = self._rng.randrange(self.count)
+            if i < self.reservoir_size:
+                self.reservoir[i] = (key, score, bankrupt)
+
+    @property
+    def var(self):
+        """Sample variance"""
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self):
+        return self.var ** 0.5
+
+    def confidence_interval(self, z=1.96):
+        """Normal approximation confidence interval of the mean (95% by default)"""
+        half = z * self.std / self.count ** 0.5 if self.count else float('inf')
+        return self.mean - half, self.mean + half
+
+
+class ScoreAggregator():
+    """Aggregates agent scores per agent type as they come in"""
+    def __init__(self, reservoir_size=0, seed=None):
+        self.reservoir_size = reservoir_size
+        self._rng = random.Random(seed)
+        self.stats = dict()
+
+    def add(self, key, type_, score, bankrupt=False):
+        if type_ not in self.stats:
+            self.stats[type_] = TypeScoreStats(self.reservoir_size, self._rng)
+        self.stats[type_].add(key, score, bankrupt)
+
+    def summary(self, z=1.96):
+        """Maps every agent type to its count, mean, std and confidence interval"""
+        return {
+            type_: dict(count=s.count, mean=s.mean, std=s.std,
+                        ci=s.confidence_interval(z), n_bankrupt=s.n_bankrupt)
+            for type_, s in self.stats.items()
+        }
+
+
+def sweep_agents(agent_types, n_processes=2, n_trials=100, agent_params=None, n_workers=None,
+                 reservoir_size=0, seed=None):
+    """
+    Runs n_trials simulations with the given agent_types in constant memory.
+
+    Unlike try_agents, worlds and per-agent scores are not kept. Returns a
+    ScoreAggregator with running statistics per agent type (and a random
+    sample of at most reservoir_size per-agent scores for each type).
+    """
+    aggregator = ScoreAggregator(reservoir_size, seed)
+
+    def collect(scores):
+        for aid, world_id, type_, score, bankrupt in scores:
+            aggregator.add(f"{aid}@{world_id}", type_, score, bankrupt)
+
+    if n_workers is None:
+        for _ in range(n_trials):
+            collect(_trial_scores(agent_types, n_processes, agent_params, False))
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            # submit in bounded batches so pending results do not pile up
+            pending = set()
+            for _ in range(n_trials):
+                if len(pending) >= 2 * n_workers:
+                    done = next(as_completed(pending))
+                    pending.remove(done)
+                    collect(done.result())
+                pending.add(executor.submit(
+                    _trial_scores, agent_types, n_processes, agent_params, False, random.randrange(2**63)
+                ))
+            for future in as_completed(pending):
+                collect(future.result())
+    return aggregator
+
+
 def analyze_contracts(world):
     """
     Analyzes the contracts signed in the given world
@@ -89,3 +267,9 @@ def print_type_scores(type_scores):
     pprint(sorted(tuple(type_scores.items()), key=lambda x: -x[1]))
 
 
+def print_score_summary(aggregator):
+    """Prints the mean score and confidence interval of every agent type"""
+    summary = aggregator.summary()
+    for type_, s in sorted(summary.items(), key=lambda x: -x[1]["mean"]):
+        lo, hi = s["ci"]
+        print(f"{type_}: {s['mean']:.4f} [{lo:.4f}, {hi:.4f}] over {s['count']} agents ({s['n_bankrupt']} bankrupt)")
@@ -0,0 +1,112 @@
+"""
+CS1440/CS2440 Negotiation Final Project
+
+File with an append-only on-disk store of tournament results
+
+"""
+
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+
+
+class ResultsStore():
+    """
+    Keeps the scores of every finished world set of a tournament on disk.
+
+    The store is a directory with two files:
+
+    - tournament.json: the path of the tournament whose configs are being run
+      and the settings it was started with so that a restarted run uses the
+      same configs (and refuses to resume with different settings).
+    - scores.jsonl: one line per finished world set with its config id and
+      score records. Lines are only ever appended and flushed to disk as soon
+      as a world set finishes.
+    """
+    SCORES_FILE = "scores.jsonl"
+    TOURNAMENT_FILE = "tournament.json"
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.scores_file = self.path / self.SCORES_FILE
+        self.tournament_file = self.path / self.TOURNAMENT_FILE
+        self._drop_incomplete_line()
+
+    def _tournament(self):
+        if not self.tournament_file.exists():
+            return {}
+        with open(self.tournament_file) as f:
+            return json.load(f)
+
+    @property
+    def tournament_path(self):
+        """The tournament this store belongs to (None if not started yet)"""
+        path = self._tournament().get("tournament_path")
+        return Path(path) if path is not None else None
+
+    @property
+    def settings(self):
+        """The settings the tournament was started with (None if unknown)"""
+        return self._tournament().get("settings")
+
+    def start(self, tournament_path, settings):
+        """Records the tournament being run and the settings it was started with"""
+        with open(self.tournament_file, "w") as f:
+            json.dump({"tournament_path": str(tournament_path), "settings": settings}, f, default=_json_value)
+
+    def check_settings(self, settings):
+        """Raises a ValueError if the given settings differ from the ones the
+        tournament was started with"""
+        stored = self.settings
+        if stored is None:
+            return
+        # compare in their stored form (tuples become lists)
+        settings = json.loads(json.dumps(settings, default=_json_value))
+        different = sorted(k for k in set(stored) | set(settings) if stored.get(k) != settings.get(k))
+        if different:
+            raise ValueError(
+                f"Cannot resume the tournament in {self.path} with different settings: "
+                + ", ".join(f"{k} was {stored.get(k)!r} and is now {settings.get(k)!r}" for k in different)
+            )
+
+    def _drop_incomplete_line(self):
+        """Removes a partially written last line left by a crash"""
+        if not self.scores_file.exists():
+            return
+        with open(self.scores_file, "rb+") as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                f.truncate(data.rfind(b"\n") + 1)
+
+    def _entries(self):
+        if not self.scores_file.exists():
+            return
+        with open(self.scores_file) as f:
+            for line in f:
+                yield json.loads(line)
+
+    def done(self):
+        """Ids of the configs already finished"""
+        return {entry["config"] for entry in self._entries()}
+
+    def scores(self):
+        """All score records saved so far"""
+        return [record for entry in self._entries() for record in entry["scores"]]
+
+    def append(self, config_id, records):
+        """Saves the score records of a finished config"""
+        line = json.dumps({"config": config_id, "scores": records}, default=_json_value)
+        with open(self.scores_file, "a") as f:
+            f.write(line + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def _json_value(value):
+    """Converts numpy values so that they are saved as numbers (not strings)"""
+    if isinstance(value, (np.generic, np.ndarray)):
+        return value.tolist()
+    raise TypeError(f"Cannot save {value!r} of type {type(value).__name__} in a results store")
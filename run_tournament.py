@@ -8,13 +8,26 @@ File to run negotiation tournament
 
 """
 
+import argparse
 import warnings
-
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import pandas as pd
+from negmas.helpers.numeric import truncated_mean
+from negmas.tournaments.tournaments import (
+    ASSIGNED_CONFIGS_PICKLE_FILE,
+    PARAMS_FILE,
+    evaluate_tournament,
+    load,
+    process_world_run,
+    run_worlds,
+)
 from scml.oneshot import *
 from scml.scml2020.utils import anac2022_oneshot
 from tier1_agent import LearningAgent
 from agents.strategicagent import GPAAgent # TODO: change the import agent name to your agent class name
-from agents.bettersyncagent import TestAgent
+from results_store import ResultsStore
 
 warnings.simplefilter("ignore")
 
@@ -22,30 +35,147 @@ warnings.simplefilter("ignore")
 def shorten_names(results):
     """
     method to make agent types more readable
+
+    Tables without the agent type columns are left alone. kstest and ttest
+    are empty with a single agent type and every table is empty if no world
+    finished.
     """
-    results.score_stats.agent_type = results.score_stats.agent_type.str.split(".").str[-1].str.split(":").str[-1]
-    results.kstest.a = results.kstest.a.str.split(".").str[-1].str.split(":").str[-1]
-    results.kstest.b = results.kstest.b.str.split(".").str[-1].str.split(":").str[-1]
-    results.total_scores.agent_type = results.total_scores.agent_type.str.split(".").str[-1].str.split(":").str[-1]
-    results.scores.agent_type = results.scores.agent_type.str.split(".").str[-1].str.split(":").str[-1]
-    results.winners = [_.split(".")[-1].split(":")[-1] for _ in results.winners]
+    def short(name):
+        return name.split(".")[-1].split(":")[-1]
+
+    for table, column in (
+        (results.score_stats, "agent_type"),
+        (results.kstest, "a"),
+        (results.kstest, "b"),
+        (results.total_scores, "agent_type"),
+        (results.scores, "agent_type"),
+    ):
+        if column in table.columns:
+            table[column] = table[column].astype(str).map(short)
+    results.winners = [short(_) for _ in results.winners]
     return results
 
 
-def main():
+def config_id(worlds_params):
+    """A stable id of a set of world configs"""
+    return ";".join(str(_["__dir_name"]) for _ in worlds_params)
+
+
+def run_parallel(competitors, n_configs=10, n_runs_per_world=1, n_steps=10, n_workers=None,
+                 on_world_done=None, print_exceptions=True, results_path=None, **kwargs):
+    """
+    Runs an anac2022_oneshot tournament spreading world configurations over a
+    process pool.
+
+    Args:
+        competitors: Agent types competing in the tournament
+        n_configs: number of different configurations to generate
+        n_runs_per_world: number of times to repeat every simulation (with agent assignment)
+        n_steps: number of days (simulation steps) per simulation
+        n_workers: number of worker processes (defaults to the number of CPUs)
+        on_world_done: called with the score records of every world (set) as
+                       soon as it finishes
+        print_exceptions: print exceptions raised while running worlds
+        results_path: If given, the scores of every world set are saved to a
+                      `ResultsStore` in this directory as soon as it finishes.
+                      Running again with the same path resumes the tournament
+                      skipping world sets that are already done. Resuming with
+                      other competitors, n_configs, n_runs_per_world or n_steps
+                      raises a ValueError.
+        kwargs: passed to anac2022_oneshot
+
+    Returns:
+        The tournament results as returned by anac2022_oneshot (after shorten_names)
+    """
+    store = ResultsStore(results_path) if results_path is not None else None
+    settings = dict(
+        competitors=[_ if isinstance(_, str) else f"{_.__module__}.{_.__qualname__}" for _ in competitors],
+        n_configs=n_configs,
+        n_runs_per_world=n_runs_per_world,
+        n_steps=n_steps,
+    )
+    tournament_path = store.tournament_path if store is not None else None
+    if tournament_path is not None:
+        store.check_settings(settings)
+    else:
+        # let scml generate and assign the configs then run them ourselves
+        configs_path = anac2022_oneshot(
+            competitors=competitors,
+            n_configs=n_configs,
+            n_runs_per_world=n_runs_per_world,
+            n_steps=n_steps,
+            configs_only=True,
+            **kwargs,
+        )
+        tournament_path = Path(configs_path).parent
+        if store is not None:
+            store.start(tournament_path, settings)
+    params = load(tournament_path / PARAMS_FILE)
+    assigned = load(tournament_path / ASSIGNED_CONFIGS_PICKLE_FILE)
+    for worlds_params in assigned:
+        for world_params in worlds_params:
+            world_params["__world_generator"] = params["world_generator_name"]
+            world_params["__score_calculator"] = params["score_calculator_name"]
+            world_params["__tournament_name"] = params["name"]
+
+    done = store.done() if store is not None else set()
+    assigned = [_ for _ in assigned if config_id(_) not in done]
+
+    scores = []
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        future_results = {
+            executor.submit(run_worlds, worlds_params): config_id(worlds_params)
+            for worlds_params in assigned
+        }
+        for future in as_completed(future_results):
+            try:
+                run_id, _, world_results, _, _, _ = future.result()
+            except Exception as e:
+                if print_exceptions:
+                    print(e)
+                continue
+            records, _ = process_world_run(run_id, world_results, tournament_name=params["name"])
+            if store is not None:
+                store.append(future_results[future], records)
+            else:
+                scores += records
+            if on_world_done is not None:
+                on_world_done(records)
+
+    if store is not None:
+        scores = store.scores()
+    results = evaluate_tournament(
+        tournament_path=tournament_path,
+        scores=pd.DataFrame.from_records(scores),
+        metric=truncated_mean,
+        compile=False,
+    )
+    return shorten_names(results)
+
+
+def main(n_configs=10, n_steps=10, n_workers=None, results_path=None):
     # TODO: Modify this list to include/delete your agents! (Make sure to change MyAgent to your agent class name)
     tournament_types = [LearningAgent, GreedyOneShotAgent, GPAAgent]
 
     # TODO: Modify the parameters to see how your agent performs in different settings
-    results = anac2022_oneshot(
-        competitors=tournament_types,
-        n_configs=10, # number of different configurations to generate
-        n_runs_per_world=1, # number of times to repeat every simulation (with agent assignment)
-        n_steps = 10, # number of days (simulation steps) per simulation
-        print_exceptions=True,
-    )
-
-    results = shorten_names(results)
+    if n_workers is None and results_path is None:
+        results = anac2022_oneshot(
+            competitors=tournament_types,
+            n_configs=n_configs, # number of different configurations to generate
+            n_runs_per_world=1, # number of times to repeat every simulation (with agent assignment)
+            n_steps = n_steps, # number of days (simulation steps) per simulation
+            print_exceptions=True,
+        )
+        results = shorten_names(results)
+    else:
+        results = run_parallel(
+            tournament_types,
+            n_configs=n_configs,
+            n_runs_per_world=1,
+            n_steps=n_steps,
+            n_workers=n_workers,
+            results_path=results_path,
+        )
 
     # TODO: Uncomment/Comment below to print/hide the winner of the tournament
     print("Winners: ", results.winners, "\n")
@@ -60,4 +190,12 @@ if __name__ == '__main__':
     http://www.yasserm.com/scml/scml2020docs/tutorials/01.run_scml2020.html#running-a-one-shot-tournament
     
     """
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Runs a one-shot tournament")
+    parser.add_argument("--configs", type=int, default=10, help="number of world configurations")
+    parser.add_argument("--steps", type=int, default=10, help="number of simulation steps per world")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="run worlds on this many worker processes")
+    parser.add_argument("--results", default=None,
+                        help="directory to save results to as worlds finish (resumes an interrupted run)")
+    args = parser.parse_args()
+    main(n_configs=args.configs, n_steps=args.steps, n_workers=args.workers, results_path=args.results)
\ No newline at end of file
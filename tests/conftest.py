@@ -0,0 +1,74 @@
+import random
+import sys
+import warnings
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from negmas import make_issue
+from scml.oneshot import OneShotUFun
+
+# the modules of the project are at the top of the repository
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+warnings.simplefilter("ignore")
+
+
+def random_ufun(rng, level=None, prices=(5, 30), with_issues=False, **kwargs):
+    """
+    A OneShotUFun of an agent in the first (level 0) or second (level 1)
+    production level with random exogenous contracts, costs and balance.
+
+    Args:
+        rng: A random.Random used for everything random.
+        level: The level of the agent (random if None).
+        prices: (min, max) unit price of the negotiation issues.
+        with_issues: Also give the ufun the issues of its negotiations (needed
+                     to invert it).
+        kwargs: Override any argument of OneShotUFun (normalized needs with_issues).
+    """
+    level = rng.randint(0, 1) if level is None else level
+    q = rng.randint(0, 10)
+    mn, mx = prices
+    params = dict(
+        ex_pin=rng.randint(0, 15) * q if level == 0 else 0, ex_qin=q if level == 0 else 0,
+        ex_pout=rng.randint(0, 30) * q if level == 1 else 0, ex_qout=q if level == 1 else 0,
+        input_product=level, input_agent=level == 0, output_agent=level == 1,
+        production_cost=rng.choice([2.5, 4, 7.3]), disposal_cost=rng.random(),
+        shortfall_penalty=rng.random(),
+        input_penalty_scale=rng.choice([None, 3.0]), output_penalty_scale=rng.choice([None, 5.0]),
+        n_input_negs=2, n_output_negs=2,
+        input_qrange=(0, 10), output_qrange=(0, 10),
+        input_prange=(mn, mx), output_prange=(mn, mx),
+        current_step=1,
+        current_balance=rng.choice([float("inf"), rng.randint(-5, 400)]),
+    )
+    if with_issues:
+        params["issues"] = [
+            make_issue((0, 10), "quantity"), make_issue((0, 0), "time"), make_issue((mn, mx), "unit_price"),
+        ]
+    normalized = kwargs.pop("normalized", False)
+    params.update(kwargs)
+    ufun = OneShotUFun(**params)
+    if normalized:
+        # OneShotUFun cannot find its limits while it is being created normalized
+        ufun.best, ufun.worst = ufun.find_limit(True), ufun.find_limit(False)
+        ufun.normalized = True
+    return ufun
+
+
+def random_offer(rng, prices=(5, 30)):
+    return (rng.randint(0, 10), 0, rng.randint(*prices))
+
+
+def synthetic_awi(level, prices=(5, 30), step=0):
+    """The parts of the AWI that BilateralUtilityFunction reads"""
+    issues = [make_issue((0, 10), "quantity"), make_issue((step, step), "time"), make_issue(prices, "unit_price")]
+    return SimpleNamespace(
+        level=level, current_step=step, current_input_issues=issues, current_output_issues=issues,
+    )
+
+
+@pytest.fixture
+def rng():
+    return random.Random(0)
@@ -0,0 +1,87 @@
+import numpy as np
+
+from agents.allocation import redistribute, split
+
+
+def old_round_robin(targets, active, amount):
+    """NewAgent.on_negotiation_failure before redistribute: hands the units
+    of a failed negotiation one at a time to the active partners in turn"""
+    i = 0
+    while amount > 0 and len(active) > 0:
+        targets[active[i]] += 1
+        amount -= 1
+        i = (i + 1) % len(active)
+    return amount
+
+
+def random_targets(rng, n):
+    return {f"p{i}": rng.choice([0, 0, rng.randint(0, 10)]) for i in range(n)}
+
+
+def test_split(rng):
+    np_rng = np.random.default_rng(0)
+    for _ in range(500):
+        weights = [rng.randint(0, 5) for _ in range(rng.randint(1, 8))]
+        if sum(weights) == 0:
+            continue
+        amount = rng.randint(0, 40)
+        for parts in (split(amount, weights), split(amount, weights, np_rng)):
+            assert parts.sum() == amount
+            shares = amount * np.array(weights) / sum(weights)
+            # every part is its share rounded down or up
+            assert (parts >= np.floor(shares)).all() and (parts <= np.floor(shares) + 1).all()
+
+
+def test_added_units_are_handed_out_round_robin(rng):
+    for _ in range(500):
+        targets = random_targets(rng, rng.randint(1, 8))
+        amount = rng.randint(0, 30)
+        expected = dict(targets)
+        left = old_round_robin(expected, list(expected), amount)
+        assert redistribute(targets, amount) == left == 0
+        assert targets == expected
+
+
+def test_matches_newagent_failure_loop(rng):
+    for _ in range(500):
+        targets = random_targets(rng, rng.randint(1, 8))
+        failed = rng.choice(list(targets))
+        active = [p for p in targets if p != failed]
+        expected = dict(targets)
+        expected[failed] = old_round_robin(expected, active, targets[failed])
+        # as NewAgent.on_negotiation_failure does it
+        moved = {p: targets[p] for p in active}
+        targets[failed] = redistribute(moved, targets[failed])
+        targets.update(moved)
+        assert targets == expected
+
+
+def test_removed_units_keep_the_total_and_no_negative_targets(rng):
+    np_rng = np.random.default_rng(0)
+    for _ in range(500):
+        targets = random_targets(rng, rng.randint(1, 8))
+        total = sum(targets.values())
+        amount = -rng.randint(1, 40)
+        before = dict(targets)
+        left = redistribute(targets, amount, rng.choice([None, np_rng]))
+        assert all(q >= 0 for q in targets.values())
+        assert all(targets[p] <= before[p] for p in targets)
+        if -amount <= total:
+            assert left == 0
+            assert sum(targets.values()) == total + amount
+        else:
+            assert left == amount + total
+            assert sum(targets.values()) == 0
+
+
+def test_removed_units_are_proportional():
+    targets = dict(a=6, b=3, c=0)
+    assert redistribute(targets, -3) == 0
+    assert targets == dict(a=4, b=2, c=0)
+
+
+def test_nothing_to_move():
+    assert redistribute({}, 5) == 5
+    targets = dict(a=1)
+    assert redistribute(targets, 0) == 0
+    assert targets == dict(a=1)
@@ -0,0 +1,26 @@
+from bench_agents import Trace, connect
+from conftest import random_offer
+
+from agents.bettersyncagent import BetterSyncAgent
+
+
+def test_get_diff_matches_from_offers(rng):
+    for seed in range(20):
+        trace = Trace(seed % 2, rng.randint(2, 8), (10, 20), 0, seed=seed)
+        agent, awi, _ = connect(BetterSyncAgent, trace)
+        agent.init()
+        agent.before_step()
+        ufun, output = agent.ufun, agent.output[0]
+
+        def utility(offers):
+            return ufun.from_offers(tuple(offers), (output,) * len(offers))
+
+        accepted = []
+        for partner in [None] + rng.sample(awi.partners, rng.randint(1, len(awi.partners))):
+            if partner is not None:
+                offer = random_offer(rng, (10, 20))
+                agent.set_accepted(partner, offer)
+                accepted.append(offer)
+            for _ in range(5):
+                offers = [random_offer(rng, (10, 20)) for _ in range(rng.randint(1, 3))]
+                assert agent.get_diff(offers) == utility(accepted + offers) - utility(accepted)
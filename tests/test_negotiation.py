@@ -0,0 +1,55 @@
+from agents.negotiation import FIRST, NegotiationTable
+
+
+class DictModel():
+    """The negotiation state as TestAgent kept it before NegotiationTable"""
+    def __init__(self, partners):
+        self.partners = partners
+        self.reset()
+
+    def reset(self):
+        self.received_offers = {}
+        self.sent_offers = {p: FIRST for p in self.partners}
+        self.proposal_count = {p: 0 for p in self.partners}
+        self.response_count = {p: 0 for p in self.partners}
+        self.wait_count = {p: 0 for p in self.partners}
+
+
+def test_table_matches_dicts(rng):
+    partners = [f"{i:02d}P@1" for i in range(6)]
+    table, model = NegotiationTable(partners), DictModel(partners)
+    for _ in range(5000):
+        partner = rng.choice(partners)
+        record = table[partner]
+        action = rng.choice(["receive", "answer", "send", "propose", "respond", "wait", "reset"])
+        if action == "receive":
+            offer = (rng.randint(1, 10), 0, rng.randint(10, 20))
+            table.receive(partner, offer)
+            model.received_offers[partner] = offer
+        elif action == "answer":
+            table.answered(partner)
+            model.received_offers.pop(partner, None)
+        elif action == "send":
+            record.sent = model.sent_offers[partner] = (rng.randint(1, 10), 0, rng.randint(10, 20))
+        elif action == "propose":
+            record.proposals += 1
+            model.proposal_count[partner] += 1
+        elif action == "respond":
+            record.responses += 1
+            model.response_count[partner] += 1
+        elif action == "wait":
+            record.waits += 1
+            model.wait_count[partner] += 1
+        elif rng.random() < 0.1:
+            table.reset()
+            model.reset()
+
+        assert table.received_offers() == model.received_offers
+        assert table.n_received == len(model.received_offers)
+        for i, p in enumerate(partners):
+            r = table[p]
+            assert r.index == i
+            assert r.received == model.received_offers.get(p)
+            assert r.sent == model.sent_offers[p]
+            assert (r.proposals, r.responses, r.waits) == (
+                model.proposal_count[p], model.response_count[p], model.wait_count[p])
@@ -0,0 +1,44 @@
+from conftest import random_ufun
+
+from agents.pricing import PriceSolver
+from agents.ufuncalc import UFunCalc
+
+
+def linear_scan(ufun, quantity, threshold, min_price, max_price, output):
+    """The price search of TestAgent before PriceSolver (None if no price is good)"""
+    prices = range(min_price, max_price + 1) if output else range(max_price, min_price - 1, -1)
+    for price in prices:
+        if ufun([quantity, 0, price]) > threshold:
+            return price
+    return None
+
+
+def test_worst_price_above_matches_linear_scan(rng):
+    for _ in range(1000):
+        level = rng.randint(0, 1)
+        mn = rng.randint(1, 20)
+        mx = mn + rng.randint(0, 30)
+        ufun = random_ufun(rng, level, prices=(mn, mx), with_issues=True,
+                           current_balance=rng.choice([1e9, 1000, 100, 20, -5]))
+        # fills max_utility in
+        ufun.find_limit(True)
+        solver = PriceSolver(UFunCalc(ufun), level == 0)
+        quantity = rng.randint(0, 10)
+        if rng.random() < 0.5:
+            # as TestAgent sets it
+            threshold = rng.uniform(0.1, 1.5) * (ufun.max_utility - ufun([0, 0, 0]))
+        else:
+            # around the utility of a price in the range
+            threshold = ufun([quantity, 0, rng.randint(mn, mx)]) + rng.choice([-0.5, 0, 0.5])
+        expected = linear_scan(ufun, quantity, threshold, mn, mx, level == 0)
+        assert solver.worst_price_above(quantity, threshold, mn, mx) == expected
+
+
+def test_utility_matches_ufun(rng):
+    for _ in range(100):
+        level = rng.randint(0, 1)
+        ufun = random_ufun(rng, level)
+        solver = PriceSolver(UFunCalc(ufun), level == 0)
+        for quantity in range(11):
+            price = rng.randint(5, 30)
+            assert solver.utility(quantity, price) == ufun([quantity, 0, price])
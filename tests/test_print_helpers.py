@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from print_helpers import ScoreAggregator
+
+
+def random_scores(rng, n):
+    types = ["A", "B", "C"]
+    return pd.DataFrame([
+        dict(key=f"{i}", type_=rng.choice(types), score=rng.gauss(1, 0.5), bankrupt=rng.random() < 0.1)
+        for i in range(n)
+    ])
+
+
+def test_aggregator_matches_pandas(rng):
+    scores = random_scores(rng, 500)
+    aggregator = ScoreAggregator(reservoir_size=1000, seed=0)
+    for row in scores.itertuples():
+        aggregator.add(row.key, row.type_, row.score, row.bankrupt)
+    summary = aggregator.summary()
+    expected = scores.groupby("type_").agg(
+        count=("score", "count"), mean=("score", "mean"), std=("score", "std"),
+        median=("score", "median"), n_bankrupt=("bankrupt", "sum"),
+    )
+    assert set(summary) == set(expected.index)
+    for type_, s in summary.items():
+        assert s["count"] == expected.loc[type_, "count"]
+        assert s["n_bankrupt"] == expected.loc[type_, "n_bankrupt"]
+        assert s["mean"] == pytest.approx(expected.loc[type_, "mean"])
+        assert s["std"] == pytest.approx(expected.loc[type_, "std"])
+        lo, hi = s["ci"]
+        assert (lo + hi) / 2 == pytest.approx(s["mean"])
+        # the reservoir is large enough to keep every score
+        reservoir = [score for _, score, _ in aggregator.stats[type_].reservoir]
+        assert np.median(reservoir) == pytest.approx(expected.loc[type_, "median"])
+
+
+def test_reservoir_is_a_sample(rng):
+    scores = random_scores(rng, 500)
+    aggregator = ScoreAggregator(reservoir_size=20, seed=0)
+    for row in scores.itertuples():
+        aggregator.add(row.key, row.type_, row.score, row.bankrupt)
+    for type_, stats in aggregator.stats.items():
+        assert len(stats.reservoir) == 20
+        rows = scores[scores.type_ == type_].set_index("key")
+        for key, score, bankrupt in stats.reservoir:
+            assert (rows.loc[key, "score"], rows.loc[key, "bankrupt"]) == (score, bankrupt)
+        assert len({key for key, _, _ in stats.reservoir}) == 20
@@ -0,0 +1,63 @@
+import contextlib
+import io
+import json
+from types import SimpleNamespace
+
+from test_regression import decisions, random_trace
+
+from agents import bettersyncagent
+from agents.profiling import CallbackProfiler, LatencyHistogram
+
+
+def test_histogram_buckets():
+    histogram = LatencyHistogram()
+    latencies = [5e-6, 1e-5, 2e-5, 2e-5, 0.5, 20.0]
+    for seconds in latencies:
+        histogram.add(seconds)
+    # buckets are closed above: 1e-5 falls in the first one
+    assert histogram.counts[0] == 2
+    assert histogram.counts[1] == 2
+    assert histogram.counts[-1] == 1
+    assert sum(histogram.counts) == histogram.count == len(latencies)
+    assert histogram.max == 20.0
+    assert histogram.quantile(0.5) == LatencyHistogram.BUCKETS[1]
+    assert histogram.quantile(1.0) == 20.0
+    report = histogram.report()
+    assert report["histogram"][:2] == [[LatencyHistogram.BUCKETS[0], 2], [LatencyHistogram.BUCKETS[1], 2]]
+    assert report["histogram"][-1] == [None, 1]
+    assert LatencyHistogram().report()["p99"] == 0.0
+
+
+def test_record_and_save(tmp_path):
+    agent = SimpleNamespace(id="a1", awi=SimpleNamespace(current_step=3))
+    profiler = CallbackProfiler(agent)
+    profiler.record("respond", 1e-3, "p1", round_=2)
+    profiler.record("get_diff", 2e-3)
+    profiler.save(tmp_path)
+    with open(tmp_path / "a1.json") as f:
+        report = json.load(f)
+    assert report["type"] == "SimpleNamespace"
+    assert report["callbacks"]["respond"]["count"] == 1
+    assert report["steps"]["3"]["get_diff"]["total"] == 2e-3
+    assert list(report["negotiations"]) == ["3:p1"]
+    assert list(report["rounds"]) == ["2"]
+
+
+# imported through the module so that pytest does not collect TestAgent
+class ProfiledAgent(bettersyncagent.TestAgent):
+    profile = True
+
+
+def test_profiled_agent(tmp_path, monkeypatch):
+    monkeypatch.setattr(ProfiledAgent, "profile_path", tmp_path)
+    trace = random_trace(1)
+    with contextlib.redirect_stdout(io.StringIO()):
+        out = decisions(ProfiledAgent, trace)
+    # the report is saved at the end of the last step
+    reports = list(tmp_path.glob("*.json"))
+    assert len(reports) == 1
+    with open(reports[0]) as f:
+        report = json.load(f)
+    assert report["type"] == "ProfiledAgent"
+    assert report["callbacks"]["propose"]["count"] + report["callbacks"]["respond"]["count"] == len(out)
+    assert sorted(report["steps"]) == [str(s) for s in range(trace.n_steps)]
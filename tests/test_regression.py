@@ -0,0 +1,97 @@
+import contextlib
+import hashlib
+import io
+import random
+
+import pytest
+from bench_agents import Trace, connect, random_offer
+from negmas import Contract, ResponseType, SAOState
+from scml.scml2020.common import QUANTITY, UNIT_PRICE
+
+from agents.newagent import NewAgent
+from agents.strategicagent import GPAAgent
+from fast_tier1_agent import FastAdaptiveAgent, FastBetterAgent, FastLearningAgent, FastSimpleAgent
+from print_helpers import run_trial
+from tier1_agent import AdaptiveAgent, BetterAgent, LearningAgent, SimpleAgent
+
+
+def decisions(agent_type, trace):
+    """Every offer and response of the agent driven through the trace (see
+    bench_agents). Partners end negotiations at random too."""
+    rng = random.Random(trace.seed)
+    agent, awi, nmis = connect(agent_type, trace)
+    out = []
+    agent.init()
+    for step in range(trace.n_steps):
+        awi.current_step = step
+        agent.set_preferences(awi.make_ufun())
+        agent.before_step()
+        active = list(awi.partners)
+        for round in range(trace.n_rounds):
+            state = SAOState(running=True, step=round, time=float(round), relative_time=round / trace.n_rounds)
+            for partner in list(active):
+                out.append(agent.propose(partner, state))
+                offer = random_offer(rng, trace, step)
+                response = agent.respond(partner, state, offer)
+                out.append(response)
+                if response == ResponseType.ACCEPT_OFFER or rng.random() < 0.05:
+                    annotation = nmis[partner].annotation
+                    contract = Contract(
+                        agreement=dict(quantity=offer[QUANTITY], time=step, unit_price=offer[UNIT_PRICE]),
+                        annotation=annotation, partners=[annotation["buyer"], annotation["seller"]],
+                    )
+                    agent.on_negotiation_success(contract, nmis[partner])
+                    active.remove(partner)
+        agent.step()
+    return out
+
+
+def random_trace(seed):
+    rng = random.Random(seed)
+    return Trace(rng.randint(0, 1), rng.randint(2, 6), rng.choice([(10, 20), (5, 50)]), 0,
+                 n_steps=3, n_rounds=10, seed=seed)
+
+
+# digests of the decisions of the agents before they were optimized
+DECISIONS = {
+    (GPAAgent, 0): "b96867e3fcbc4270",
+    (GPAAgent, 1): "46b0e87e5c20c206",
+    (GPAAgent, 2): "562825a02fef9f2a",
+    (GPAAgent, 3): "655aa2af7964e723",
+    (NewAgent, 0): "af0489eed381befb",
+    (NewAgent, 1): "3ffb0e7494d920a1",
+    (NewAgent, 2): "5114b7bdc70ccdc3",
+    (NewAgent, 3): "e5063ec0f5e90a7c",
+}
+
+
+@pytest.mark.parametrize("agent_type, seed", list(DECISIONS), ids=lambda x: getattr(x, "__name__", str(x)))
+def test_decisions_unchanged(agent_type, seed):
+    # NewAgent picks outcomes with `random`
+    random.seed(seed)
+    with contextlib.redirect_stdout(io.StringIO()):
+        out = decisions(agent_type, random_trace(seed))
+    assert hashlib.sha256(repr(out).encode()).hexdigest()[:16] == DECISIONS[agent_type, seed]
+
+
+@pytest.mark.parametrize("agent_type, fast_type", [
+    (SimpleAgent, FastSimpleAgent),
+    (BetterAgent, FastBetterAgent),
+    (AdaptiveAgent, FastAdaptiveAgent),
+    (LearningAgent, FastLearningAgent),
+])
+def test_fast_agents_decide_like_originals(agent_type, fast_type):
+    for seed in range(3):
+        trace = random_trace(seed)
+        assert decisions(fast_type, trace) == decisions(agent_type, trace)
+
+
+@pytest.mark.parametrize("seed", [2, 3])
+def test_fast_agents_score_like_originals(seed):
+    originals = [SimpleAgent, LearningAgent]
+    fast = [FastSimpleAgent, FastLearningAgent]
+    with contextlib.redirect_stdout(io.StringIO()):
+        _, expected = run_trial(originals, seed=seed)
+        _, scores = run_trial(fast, seed=seed)
+    assert [s[3:] for s in scores] == [s[3:] for s in expected]
+    assert [s[2] for s in scores] == ["Fast" + s[2] for s in expected]
@@ -0,0 +1,55 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from agents.reports import PartnerBalances
+
+
+class ReportsAWI():
+    """Financial reports with random balances (every partner is in every report)"""
+    def __init__(self, rng, partners, n_steps):
+        self.reports = {
+            step: {p: SimpleNamespace(cash=rng.uniform(-100, 2000)) for p in partners}
+            for step in range(n_steps)
+        }
+        self.calls = 0
+
+    def reports_at_step(self, step):
+        self.calls += 1
+        return self.reports.get(step)
+
+
+def test_balances_match_unbounded_lists(rng):
+    partners = ["p0", "p1", "p2"]
+    awi = ReportsAWI(rng, partners, 20)
+    balances = PartnerBalances(awi, partners, window=8)
+    # the lists the agents kept before
+    old = {p: [] for p in partners}
+    for step in range(20):
+        balances.update(step)
+        # read only once per step
+        balances.update(step)
+        for p in partners:
+            old[p].append(awi.reports[step][p].cash)
+        assert awi.calls == step + 1
+        assert len(balances) == min(step + 1, 8)
+        assert balances.latest().tolist() == [old[p][-1] for p in partners]
+        assert balances.balance("p1") == old["p1"][-1]
+        recent = balances.recent()
+        assert recent.tolist() == [[old[p][i] for p in partners] for i in range(max(0, step - 7), step + 1)]
+        assert balances.recent(3).tolist() == recent[-3:].tolist()
+        assert recent.mean(axis=0) == pytest.approx([np.mean(old[p][-8:]) for p in partners])
+
+
+def test_missing_reports_and_partners(rng):
+    awi = ReportsAWI(rng, ["p0"], 2)
+    balances = PartnerBalances(awi, ["p0", "p1"])
+    with pytest.raises(IndexError):
+        balances.latest()
+    # no report for the step
+    balances.update(5)
+    assert len(balances) == 0
+    balances.update(0)
+    assert balances.balance("p0") == awi.reports[0]["p0"].cash
+    assert np.isnan(balances.balance("p1"))
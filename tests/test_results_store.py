@@ -0,0 +1,66 @@
+import json
+
+import numpy as np
+import pytest
+from scml.oneshot import GreedyOneShotAgent, RandomOneShotAgent
+
+import run_tournament
+from results_store import ResultsStore
+from run_tournament import run_parallel
+
+SETTINGS = dict(competitors=["a.A", "b.B"], n_configs=2, n_runs_per_world=1, n_steps=10)
+
+
+def test_round_trip(tmp_path):
+    store = ResultsStore(tmp_path)
+    records = [dict(agent_type="A", score=np.float64(0.5), n=np.int64(3), arr=np.arange(2))]
+    store.append("c1", records)
+    store.append("c2", [dict(agent_type="B", score=1.0)])
+    assert store.done() == {"c1", "c2"}
+    scores = store.scores()
+    assert scores == [dict(agent_type="A", score=0.5, n=3, arr=[0, 1]), dict(agent_type="B", score=1.0)]
+    # saved as numbers, not strings
+    assert isinstance(scores[0]["score"], float) and isinstance(scores[0]["n"], int)
+    with pytest.raises(TypeError, match="object"):
+        store.append("c3", [dict(score=object())])
+
+
+def test_resume(tmp_path):
+    store = ResultsStore(tmp_path)
+    assert store.tournament_path is None and store.settings is None
+    store.start(tmp_path / "tournament", dict(SETTINGS, competitors=("a.A", "b.B")))
+    store.append("c1", [dict(score=1.0)])
+    # a crash while writing the second line
+    with open(store.scores_file, "a") as f:
+        f.write('{"config": "c2", "sco')
+
+    resumed = ResultsStore(tmp_path)
+    assert resumed.tournament_path == tmp_path / "tournament"
+    assert resumed.settings == SETTINGS
+    assert resumed.done() == {"c1"}
+    assert resumed.scores() == [dict(score=1.0)]
+    assert [json.loads(line) for line in open(resumed.scores_file)] == [dict(config="c1", scores=[dict(score=1.0)])]
+    # tuples are saved as lists
+    resumed.check_settings(dict(SETTINGS, competitors=("a.A", "b.B")))
+
+
+def test_resume_with_other_settings(tmp_path):
+    store = ResultsStore(tmp_path)
+    store.check_settings(SETTINGS)
+    store.start(tmp_path / "tournament", SETTINGS)
+    with pytest.raises(ValueError, match="n_steps was 10 and is now 20"):
+        ResultsStore(tmp_path).check_settings(dict(SETTINGS, n_steps=20))
+
+
+def test_run_parallel_resumes(tmp_path, monkeypatch):
+    competitors = [GreedyOneShotAgent, RandomOneShotAgent]
+    kwargs = dict(n_configs=1, n_steps=5, n_workers=1, results_path=tmp_path / "results",
+                  tournament_path=str(tmp_path), verbose=False)
+    results = run_parallel(competitors, **kwargs)
+    # every world set is done so nothing runs again
+    monkeypatch.setattr(run_tournament, "run_worlds", None)
+    resumed = run_parallel(competitors, **kwargs)
+    assert resumed.winners == results.winners
+    assert resumed.score_stats.equals(results.score_stats)
+    with pytest.raises(ValueError, match="n_steps"):
+        run_parallel(competitors, **dict(kwargs, n_steps=6))
@@ -0,0 +1,30 @@
+from scml.oneshot import GreedyOneShotAgent, RandomOneShotAgent
+
+import run_tournament
+from run_tournament import run_parallel
+
+COMPETITORS = [GreedyOneShotAgent, RandomOneShotAgent]
+
+
+def failing_worlds(worlds_params):
+    raise RuntimeError("world failed")
+
+
+def test_run_parallel(tmp_path):
+    results = run_parallel(COMPETITORS, n_configs=1, n_steps=5, n_workers=1,
+                           tournament_path=str(tmp_path), verbose=False)
+    # the competitors in the one config are picked at random and can tie
+    assert results.winners
+    assert not any("." in winner for winner in results.winners)
+    assert 1 <= len(results.score_stats) <= len(COMPETITORS)
+    assert not results.score_stats["agent_type"].str.contains(r"\.|:").any()
+
+
+def test_run_parallel_without_finished_worlds(tmp_path, monkeypatch, capsys):
+    # the function is looked up by name in the (forked) worker
+    monkeypatch.setattr(run_tournament, "run_worlds", failing_worlds)
+    results = run_parallel(COMPETITORS, n_configs=1, n_steps=5, n_workers=1,
+                           tournament_path=str(tmp_path), verbose=False)
+    assert "world failed" in capsys.readouterr().out
+    assert results.winners == []
+    assert results.score_stats.empty and results.kstest.empty
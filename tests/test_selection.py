@@ -0,0 +1,43 @@
+from itertools import combinations
+
+import pytest
+from conftest import random_offer, random_ufun
+
+from agents.selection import SubsetSelector
+from agents.ufuncalc import UFunCalc
+
+
+def random_case(rng, n_offers):
+    level = rng.randint(0, 1)
+    selector = SubsetSelector(UFunCalc(random_ufun(rng, level)), level == 0, time_budget=float("inf"))
+    offers = {f"{i:02d}P": random_offer(rng) for i in range(n_offers)}
+    accepted = [random_offer(rng) for _ in range(rng.randint(0, 2))]
+    return selector, offers, accepted
+
+
+def test_exhaustive_finds_the_best_subset(rng):
+    for _ in range(30):
+        selector, offers, accepted = random_case(rng, rng.randint(0, 6))
+        partners, u = selector.select(offers, accepted)
+        items = list(offers.values())
+        best = max(
+            selector.utility(items, chosen, accepted)
+            for n in range(len(items) + 1) for chosen in combinations(range(len(items)), n)
+        )
+        assert u == best
+        assert selector.utility(items, [list(offers).index(p) for p in partners], accepted) == u
+
+
+@pytest.mark.parametrize("n_offers", [11, 14])
+def test_large_is_consistent_and_no_worse_than_greedy(rng, n_offers):
+    for _ in range(5):
+        selector, offers, accepted = random_case(rng, n_offers)
+        partners, u = selector.select(offers, accepted)
+        items = list(offers.values())
+        chosen = [list(offers).index(p) for p in partners]
+        assert selector.utility(items, chosen, accepted) == u
+        assert u >= selector.utility(items, (), accepted)
+        assert u >= selector._greedy(items, tuple(accepted), float("inf"))[1]
+        # a local optimum: no single offer added or dropped improves it
+        for i in range(len(items)):
+            assert selector.utility(items, sorted(set(chosen) ^ {i}), accepted) <= u
@@ -0,0 +1,79 @@
+import numpy as np
+from conftest import random_offer, random_ufun, synthetic_awi
+
+from agents.strategy import StrategyGoldfishParetoAspiration, pareto_mask
+from agents.ufuns import BilateralUtilityFunction, OpponentUtilityFunction
+
+
+def brute_force_pareto(my_us, opp_us):
+    """The dominance loop of calculate_pareto_frontier before pareto_mask"""
+    mask = []
+    for u1, v1 in zip(my_us, opp_us):
+        mask.append(not any(
+            (u2 > u1 and v2 >= v1) or (u2 >= u1 and v2 > v1) for u2, v2 in zip(my_us, opp_us)
+        ))
+    return np.array(mask, dtype=bool)
+
+
+def test_pareto_mask_matches_brute_force(rng):
+    for _ in range(500):
+        n = rng.randint(0, 40)
+        # few distinct values so that duplicates and ties are common
+        levels = rng.randint(1, 6)
+        my_us = [float(rng.randint(0, levels)) for _ in range(n)]
+        opp_us = [float(rng.randint(0, levels)) for _ in range(n)]
+        assert (pareto_mask(my_us, opp_us) == brute_force_pareto(my_us, opp_us)).all()
+
+
+def test_pareto_mask_edge_cases():
+    assert pareto_mask([], []).shape == (0,)
+    # identical points do not dominate each other
+    assert pareto_mask([1, 1], [2, 2]).tolist() == [True, True]
+    # same utility for me, the higher opponent utility dominates
+    assert pareto_mask([1, 1, 0], [2, 3, 5]).tolist() == [False, True, True]
+
+
+def frontier_setup(rng, level):
+    ufun = random_ufun(rng, level)
+    my_ufun = BilateralUtilityFunction(ufun, synthetic_awi(level), [])
+    return my_ufun, OpponentUtilityFunction(1 - level, 3)
+
+
+def assert_same_info(a, b):
+    assert a.sorted_offers == b.sorted_offers
+    assert a.sorted_utils == b.sorted_utils
+    assert (a.nash_point, a.start_util, a.end_util) == (b.nash_point, b.start_util, b.end_util)
+
+
+def test_frontier_info_cache(rng):
+    for _ in range(10):
+        strategy = StrategyGoldfishParetoAspiration()
+        my_ufun, opp_ufun = frontier_setup(rng, rng.randint(0, 1))
+        info = strategy.frontier_info(my_ufun, opp_ufun)
+        assert strategy.frontier_info(my_ufun, opp_ufun) is info
+
+        # accepting an offer changes my utilities so the frontier is found again
+        my_ufun.add_offer(random_offer(rng))
+        updated = strategy.frontier_info(my_ufun, opp_ufun)
+        assert updated is not info
+        assert_same_info(updated, StrategyGoldfishParetoAspiration().frontier_info(my_ufun, opp_ufun))
+
+        # another opponent model
+        other_opp = OpponentUtilityFunction(opp_ufun.level, 3, last_opp_offer=(7, 0, 15))
+        assert strategy.frontier_info(my_ufun, other_opp) is not updated
+        assert strategy.frontier_info(my_ufun, opp_ufun) is updated
+
+        # a new step starts with an empty cache
+        my_ufun.awi.current_step += 1
+        assert strategy.frontier_info(my_ufun, opp_ufun) is not updated
+        assert len(strategy.cache) == 1
+
+
+def test_propose_falls_back_to_the_best_offer(rng):
+    strategy = StrategyGoldfishParetoAspiration()
+    my_ufun, opp_ufun = frontier_setup(rng, 0)
+    info = strategy.frontier_info(my_ufun, opp_ufun)
+    assert info.start_util > info.end_util
+    # at a negative time the target is above my best utility
+    assert info.offer_above(2 * info.start_util - info.end_util) is None
+    assert strategy.propose(my_ufun, opp_ufun, -1.0) == my_ufun.best_offer
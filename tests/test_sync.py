@@ -0,0 +1,46 @@
+import contextlib
+import io
+
+import pytest
+from negmas import ResponseType, SAOResponse
+
+from agents import bettersyncagent
+from agents.newagent import SyncNewAgent
+from agents.strategicagent import SyncGPAAgent
+from print_helpers import run_trial
+
+
+def checked(agent_type, joint_acceptance):
+    """A subclass of agent_type that records what counter_all gets and returns"""
+    class Checked(agent_type):
+        calls = []
+
+        def counter_all(self, offers, states):
+            responses = super().counter_all(offers, states)
+            self.calls.append((dict(offers), responses))
+            return responses
+
+    Checked.joint_acceptance = joint_acceptance
+    Checked.__name__ = agent_type.__name__
+    return Checked
+
+
+@pytest.mark.parametrize("joint_acceptance", [False, True])
+@pytest.mark.parametrize("agent_type", [SyncNewAgent, bettersyncagent.SyncTestAgent, SyncGPAAgent],
+                         ids=lambda t: t.__name__)
+def test_sync_agents_answer_every_offer(agent_type, joint_acceptance):
+    checked_type = checked(agent_type, joint_acceptance)
+    with contextlib.redirect_stdout(io.StringIO()):
+        world, scores = run_trial([checked_type], seed=1)
+    assert not world.agent_exceptions and not world.negotiator_exceptions
+    assert not world.simulation_exceptions
+    assert len(world.saved_contracts) > 0
+    assert {type_ for _, _, type_, _, _ in scores} == {agent_type.__name__}
+    assert checked_type.calls
+    for offers, responses in checked_type.calls:
+        assert set(responses) == set(offers)
+        for response in responses.values():
+            assert isinstance(response, SAOResponse)
+            assert response.response in (ResponseType.ACCEPT_OFFER, ResponseType.REJECT_OFFER)
+            # a rejection comes with a counter offer
+            assert (response.outcome is not None) == (response.response == ResponseType.REJECT_OFFER)
@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+from conftest import random_offer, random_ufun
+from scml.scml2020.common import QUANTITY, TIME, UNIT_PRICE
+
+from agents.ufuncalc import UFunCalc
+
+
+def random_offers(rng, n):
+    offers = [random_offer(rng) for _ in range(n)]
+    outputs = [rng.random() < 0.5 for _ in range(n)]
+    return offers, outputs
+
+
+def test_batch_matches_scalar(rng):
+    candidates = np.array([(q, 0, p) for q in range(11) for p in range(5, 31)])
+    for _ in range(40):
+        calc = UFunCalc(random_ufun(rng, with_issues=True, normalized=rng.random() < 0.5))
+        offers, outputs = random_offers(rng, rng.randint(0, 5))
+        output = rng.random() < 0.5
+        batch, producible = calc.from_offers_batch(offers, outputs, candidates, output, return_producible=True)
+        for i, candidate in enumerate(candidates):
+            candidate = tuple(int(_) for _ in candidate)
+            try:
+                expected = calc.from_offers(offers + [candidate], outputs + [output], return_producible=True)
+            except AssertionError:
+                continue
+            assert (batch[i], producible[i]) == expected
+
+
+def test_fast_path_matches_general_path(rng):
+    for _ in range(300):
+        ufun = random_ufun(rng)
+        fast, general = UFunCalc(ufun), UFunCalc(ufun)
+        # nothing is small enough for the fast path
+        general.FAST_PATH_MAX_OFFERS = -1
+        offers, outputs = random_offers(rng, rng.randint(0, UFunCalc.FAST_PATH_MAX_OFFERS))
+        try:
+            expected = general.from_offers(offers, outputs, return_producible=True)
+        except AssertionError:
+            continue
+        assert fast.from_offers(offers, outputs, return_producible=True) == expected
+
+
+def test_dict_offers(rng):
+    for n in (2, UFunCalc.FAST_PATH_MAX_OFFERS + 2):
+        calc = UFunCalc(random_ufun(rng))
+        offers, outputs = random_offers(rng, n)
+        dicts = [dict(quantity=o[QUANTITY], time=o[TIME], unit_price=o[UNIT_PRICE]) for o in offers]
+        assert calc.from_offers(dicts, outputs) == calc.from_offers(offers, outputs)
+
+
+def test_from_offers_matches_ufun(rng):
+    calc = UFunCalc(random_ufun(rng))
+    for _ in range(300):
+        # a new ufun every step
+        ufun = random_ufun(rng)
+        calc.refresh(ufun)
+        offers, outputs = random_offers(rng, rng.randint(0, 14))
+        try:
+            expected = ufun.from_offers(tuple(offers), tuple(outputs))
+        except AssertionError:
+            continue
+        assert calc.from_offers(offers, outputs) == expected
+
+
+def test_from_aggregates_matches_ufun(rng):
+    for _ in range(300):
+        ufun = random_ufun(rng, with_issues=True, normalized=rng.random() < 0.5)
+        calc = UFunCalc(ufun)
+        qin, qout = rng.randint(0, 20), rng.randint(0, 20)
+        sold = rng.randint(0, qout)
+        args = (qin, qout, sold, rng.uniform(0, 300), rng.uniform(0, 600), rng.uniform(0, 10), rng.uniform(0, 10))
+        assert calc.from_aggregates(*args) == pytest.approx(ufun.from_aggregates(*args))
+        # arrays give the same as one call per element
+        arrays = [np.array([a, a]) for a in args]
+        assert np.array_equal(calc.from_aggregates(*arrays), [calc.from_aggregates(*args)] * 2)
+
+
+def test_baseline_matches_from_offers(rng):
+    for _ in range(300):
+        calc = UFunCalc(random_ufun(rng))
+        ctx = calc.context
+        # prices equal to the exogenous ones check the order of ties
+        prices = [5, 10, 20, 30, ctx.ex_unit_pin, ctx.ex_unit_pout]
+        n = rng.randint(0, 14)
+        offers = [(rng.randint(0, 10), 0, rng.choice(prices)) for _ in range(n)]
+        outputs = [rng.random() < 0.5 for _ in range(n)]
+        try:
+            baseline = calc.baseline(offers, outputs)
+        except AssertionError:
+            continue
+        assert baseline.utility == calc.from_offers(offers, outputs)
+        for _ in range(5):
+            offer, output = (rng.randint(0, 10), 0, rng.choice(prices)), rng.random() < 0.5
+            try:
+                expected = calc.from_offers(offers + [offer], outputs + [output])
+            except AssertionError:
+                continue
+            assert baseline.with_offer(offer, output) == expected
@@ -0,0 +1,102 @@
+import random
+
+import pytest
+from conftest import random_offer, random_ufun, synthetic_awi
+
+from agents.ufuns import (
+    BilateralUtilityFunction, InverseUtilityIndex, OpponentUtilityFunction, OpponentUtilityFunctionFactory,
+)
+
+
+def scalar_utility(ufun, others, offer, output):
+    offers = tuple(others) + (offer,)
+    return ufun.from_offers(offers, (output,) * len(offers))
+
+
+def test_bilateral_table_matches_ufun(rng):
+    for _ in range(20):
+        level = rng.randint(0, 1)
+        ufun = random_ufun(rng, level)
+        others = [random_offer(rng) for _ in range(rng.randint(0, 3))]
+        bilateral = BilateralUtilityFunction(ufun, synthetic_awi(level), others)
+        assert bilateral.table.shape == (11, 26)
+        for offer in bilateral.offer_set:
+            assert bilateral(offer) == scalar_utility(ufun, others, offer, level == 0)
+        assert bilateral(bilateral.best_offer) == bilateral.table.max()
+        # outside the grid
+        assert bilateral((3, 0, 40)) == scalar_utility(ufun, others, (3, 0, 40), level == 0)
+
+
+def test_add_offer_matches_rebuilt_table(rng):
+    for _ in range(20):
+        level = rng.randint(0, 1)
+        ufun = random_ufun(rng, level)
+        others = [random_offer(rng) for _ in range(rng.randint(0, 3))]
+        bilateral = BilateralUtilityFunction(ufun, synthetic_awi(level), others)
+        accepted = random_offer(rng)
+        bilateral.add_offer(accepted)
+        others.append(accepted)
+        rebuilt = BilateralUtilityFunction(ufun, synthetic_awi(level), others)
+        assert (bilateral.table == rebuilt.table).all()
+        assert bilateral.best_offer == rebuilt.best_offer
+        for offer in rng.sample(bilateral.offer_set, 20):
+            assert bilateral(offer) == scalar_utility(ufun, others, offer, level == 0)
+
+
+def test_opponent_table_matches_ufun(rng):
+    for level in (0, 1):
+        opponent = OpponentUtilityFunction(level, rng.randint(1, 7), last_opp_offer=rng.choice([None, (4, 0, 12)]))
+        table = opponent.utility_table(10, 20)
+        assert not table.flags.writeable
+        assert opponent.utility_table(10, 20) is table
+        for q in range(11):
+            for p in range(10, 21):
+                assert table[q, p - 10] == opponent((q, 0, p))
+
+
+def test_opponent_factory_shares_models():
+    factory = OpponentUtilityFunctionFactory(maxsize=4)
+    model = factory(0, 3, last_opp_offer=(5, 0, 12))
+    # only the quantity of the last offer matters
+    assert factory(0, 3, last_opp_offer=(5, 1, 18)) is model
+    assert model.params == (0, 4, 5)
+    assert factory(1, 3) is not model
+    assert factory(0, 3) is not model
+    assert factory.stats() == dict(hits=1, misses=3, size=3, maxsize=4)
+
+
+def test_opponent_factory_evicts_the_least_recently_used():
+    factory = OpponentUtilityFunctionFactory(maxsize=2)
+    first, second = factory(0, 1), factory(0, 2)
+    # a hit makes first the most recently used so second is evicted
+    assert factory(0, 1) is first
+    factory(0, 3)
+    assert list(factory.models) == [(0, 1, None), (0, 3, None)]
+    assert factory(0, 1) is first
+    assert factory(0, 2) is not second
+    assert factory.stats() == dict(hits=2, misses=4, size=2, maxsize=2)
+
+
+def test_inverse_index_matches_inverse(rng):
+    for _ in range(10):
+        ufun = random_ufun(rng, prices=(rng.randint(5, 15), rng.randint(15, 25)), with_issues=True)
+        inverse = ufun.invert()
+        index = InverseUtilityIndex(inverse)
+        utilities = [u for u, _ in inverse._ordered_outcomes]
+        # NewAgent asks for 1 - t / 50 and the utilities of the outcomes hit it exactly
+        targets = [1 - t / 50 for t in range(51)] + rng.sample(utilities, 20)
+        for target in targets:
+            seed = rng.random()
+            random.seed(seed)
+            expected = inverse.one_in(target, True)
+            random.seed(seed)
+            assert index.one_at(target) == expected
+
+
+def test_inverse_index_needs_sorted_outcomes(rng):
+    ufun = random_ufun(rng, with_issues=True)
+    with pytest.raises(TypeError, match="PresortingInverseUtilityFunction"):
+        InverseUtilityIndex(object())
+    # not initialized yet
+    with pytest.raises(TypeError):
+        InverseUtilityIndex(type(ufun.invert())(ufun))